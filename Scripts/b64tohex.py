@@ -8,10 +8,33 @@
 
 from sys import exit
 from sys import argv as sys_argv
-from time import sleep
+from sys import stdin, stdout, stderr
+from os import cpu_count
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from traceback import format_exc
 from signal import signal, SIGTERM, SIGINT
+from re import compile as re_compile
 from base64 import b64decode
+from binascii import a2b_base64, b2a_hex
+
+####################################################################################################
+
+### Constants ###
+
+# Chunk size used to read input data in streaming mode
+CHUNK_SIZE = 4*1024*1024
+
+# Number of lines converted at once in line batch mode (and per worker process task)
+BATCH_LINES = 65536
+
+# Whitespace characters ignored from BASE64 input data in streaming mode
+WHITESPACES = b" \t\r\n"
+
+# BASE64 alphabet characters (without "=" padding, that is only valid at the end of the data)
+B64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+B64_INVALID_RE = re_compile(rb"[^A-Za-z0-9+/ \t\r\n]")
 
 ####################################################################################################
 
@@ -33,6 +56,138 @@ def print_script_usage():
     print("You need to provide a valid BASE64 string.")
     print("Example:")
     print("  python b64tohex.py woidjw==")
+    print("")
+    print("Streaming mode (convert a file or stdin \"-\", to a file or stdout):")
+    print("  python b64tohex.py -f data.b64 [-o data.hex]")
+    print("  cat data.b64 | python b64tohex.py -f -")
+    print("")
+    print("Line batch mode (one value per line from a file or stdin \"-\", one result per line):")
+    print("  python b64tohex.py -l values.txt [-o results.txt] [-j N]")
+    print("  cat values.txt | python b64tohex.py -l - -j 0")
+
+
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-f file"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
+def b64_invalid_message(data, invalid_offset, base_offset=0):
+    '''Get the error message of an invalid BASE64 character found in data (bytes).'''
+    return "Invalid BASE64 character {} at offset {}".format(
+            repr(data[invalid_offset:invalid_offset+1])[1:], base_offset + invalid_offset)
+
+
+def b64_check_stream(f_in):
+    '''Read BASE64 data from a binary file object by chunks and yield the characters of each
+    chunk without whitespaces. Raise a ValueError with the offset and character of the first
+    character out of the BASE64 alphabet (or "=" padding that is not at the end of the data).'''
+    offset = 0
+    num_padding = 0
+    while True:
+        chunk = f_in.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        cleaned = chunk.translate(None, WHITESPACES)
+        # Fast path, all the characters are in the alphabet
+        if num_padding or cleaned.translate(None, B64_ALPHABET):
+            pos = 0
+            if not num_padding:
+                pos = B64_INVALID_RE.search(chunk).start()
+            # Only padding and whitespaces are valid after the first "=" (up to 2 of them)
+            for i in range(pos, len(chunk)):
+                if chunk[i] == ord("="):
+                    num_padding += 1
+                    if num_padding <= 2:
+                        continue
+                elif chunk[i] in WHITESPACES:
+                    continue
+                raise ValueError(b64_invalid_message(chunk, i, offset))
+        offset += len(chunk)
+        yield cleaned
+
+
+def b64_to_hex_stream(f_in, f_out):
+    '''Decode BASE64 data from a binary file object into hexadecimal in another binary file object.
+    Input is read by chunks and each chunk is converted aligned to 4 characters BASE64 quanta,
+    so memory usage is bounded whatever the data size is.'''
+    pending = b""
+    for chunk in b64_check_stream(f_in):
+        chunk = pending + chunk
+        num_aligned = len(chunk) - (len(chunk) % 4)
+        pending = chunk[num_aligned:]
+        if num_aligned:
+            f_out.write(b2a_hex(a2b_base64(chunk[:num_aligned])))
+    # Add padding to the last quantum to avoid fail if not present
+    if pending:
+        pending = pending + b"=" * (-len(pending) % 4)
+        f_out.write(b2a_hex(a2b_base64(pending)))
+    f_out.write(b"\n")
+
+
+def b64_to_hex_value(value):
+    '''Decode a BASE64 value (bytes) into hexadecimal (bytes), adding padding if not present.
+    Raise an error if the value has characters out of the BASE64 alphabet.'''
+    value = value + b"=" * (-len(value) % 4)
+    return b2a_hex(b64decode(value, validate=True))
+
+
+def b64_to_hex_lines(l_lines):
+    '''Convert a block of BASE64 values (bytes lines) into hexadecimal.
+    Return the output data (one result per line) and a list of (line index, error) of the
+    values that can't be converted (an empty line is written for them).'''
+    l_results = []
+    l_errors = []
+    for i, line in enumerate(l_lines):
+        value = line.strip()
+        if not value:
+            l_results.append(b"")
+            continue
+        try:
+            l_results.append(b64_to_hex_value(value))
+        except Exception as e:
+            l_results.append(b"")
+            l_errors.append((i, str(e)))
+    l_results.append(b"")
+    return b"\n".join(l_results), l_errors
+
+
+def b64_to_hex_batch(f_in, f_out, num_workers=None):
+    '''Convert BASE64 values from a binary file object (one per line) into hexadecimal
+    results in another binary file object (one per line). Lines are processed by blocks, in a
+    pool of processes if num_workers is provided (0 for all the CPU cores), keeping a bounded
+    number of blocks in flight. Return the number of lines that can't be converted.'''
+    num_errors = 0
+    def write_block(block_index, result):
+        nonlocal num_errors
+        data, l_errors = result
+        f_out.write(data)
+        for i, error in l_errors:
+            stderr.write("Line {}: {}\n".format(block_index*BATCH_LINES + i + 1, error))
+        num_errors += len(l_errors)
+    blocks = iter(lambda: list(islice(f_in, BATCH_LINES)), [])
+    if num_workers is None:
+        for block_index, l_lines in enumerate(blocks):
+            write_block(block_index, b64_to_hex_lines(l_lines))
+        return num_errors
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        in_flight = deque()
+        for block_index, l_lines in enumerate(blocks):
+            in_flight.append((block_index, executor.submit(b64_to_hex_lines, l_lines)))
+            if len(in_flight) >= 2*num_workers:
+                done_index, future = in_flight.popleft()
+                write_block(done_index, future.result())
+        for done_index, future in in_flight:
+            write_block(done_index, future.result())
+    return num_errors
 
 ####################################################################################################
 
@@ -42,6 +197,40 @@ def main():
     '''Main Function.'''
     try:
         argv = get_and_check_args()
+        # Line batch mode
+        input_path = get_option_value(argv, "-l")
+        if input_path is not None:
+            output_path = get_option_value(argv, "-o", "-")
+            num_workers = get_option_value(argv, "-j")
+            if num_workers is not None:
+                num_workers = int(num_workers)
+            f_in = stdin.buffer if input_path == "-" else open(input_path, "rb")
+            f_out = stdout.buffer if output_path == "-" else open(output_path, "wb")
+            try:
+                num_errors = b64_to_hex_batch(f_in, f_out, num_workers)
+            finally:
+                if f_in is not stdin.buffer:
+                    f_in.close()
+                if f_out is not stdout.buffer:
+                    f_out.close()
+            finish(1 if num_errors else 0)
+        # Streaming mode
+        input_path = get_option_value(argv, "-f")
+        if input_path is not None:
+            output_path = get_option_value(argv, "-o", "-")
+            f_in = stdin.buffer if input_path == "-" else open(input_path, "rb")
+            f_out = stdout.buffer if output_path == "-" else open(output_path, "wb")
+            try:
+                b64_to_hex_stream(f_in, f_out)
+            except ValueError as e:
+                stderr.write("Error: {}\n".format(e))
+                finish(1)
+            finally:
+                if f_in is not stdin.buffer:
+                    f_in.close()
+                if f_out is not stdout.buffer:
+                    f_out.close()
+            finish(0)
         b64_string = argv[0]
         b64_string = "{}==".format(b64_string) # Add padding to avoid fail if not present
         hex_string = b64decode(b64_string)
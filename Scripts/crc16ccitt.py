@@ -7,6 +7,11 @@
 
 from sys import exit
 from sys import argv as sys_argv
+from sys import stdin
+from os import stat, fstat, cpu_count
+from concurrent.futures import ProcessPoolExecutor
+from mmap import mmap, ACCESS_READ
+from struct import iter_unpack
 from traceback import format_exc
 from signal import signal, SIGTERM, SIGINT
 
@@ -17,6 +22,23 @@ from signal import signal, SIGTERM, SIGINT
 FILE_NAME = sys_argv[0]
 CRC16_CCITT_POLY = 0x8408
 
+# Minimum data sizes to use slicing-by-4 and slicing-by-8 instead of single table lookup
+SLICING_4_MIN_SIZE = 16
+SLICING_8_MIN_SIZE = 256
+
+# Minimum file size to split it between multiple processes in parallel mode
+PARALLEL_MIN_SIZE = 4*1024*1024
+
+# Chunk size used to read files in streaming mode (multiple of 8 for slicing)
+CHUNK_SIZE = 1024*1024
+
+####################################################################################################
+
+### Globals ###
+
+# CRC-16 lookup tables cache, keyed by reflected poly
+crc16_tables = {}
+
 ####################################################################################################
 
 ### Functions ###
@@ -31,11 +53,29 @@ def get_and_check_args():
     return argv[1:]
 
 
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-j 4"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
 def print_script_usage():
     '''Function that shows script usage help.'''
-    print("You need to provide a file.")
-    print("Example:")
+    print("You need to provide a file (or \"-\" to read from stdin).")
+    print("Options:")
+    print("  --mmap  Memory-map the file instead of reading it by chunks.")
+    print("  -j N    Split the file between N processes (0 for all the CPU cores).")
+    print("Examples:")
     print("  python {} file.bin".format(FILE_NAME))
+    print("  python {} file.bin --mmap".format(FILE_NAME))
+    print("  python {} file.bin -j 0".format(FILE_NAME))
+    print("  cat file.bin | python {} -".format(FILE_NAME))
     print("")
 
 
@@ -55,6 +95,243 @@ def crc16(data, poly, init = 0xFFFF, reverse=False):
         crc = (crc << 8) | ((crc >> 8) & 0xFF)
     return crc & 0xFFFF
 
+
+def crc16_get_tables(poly):
+    '''Get the 8 slicing lookup tables for a reflected CRC-16 poly (built once and cached).
+    Table 0 is the classic 256 entries byte table, table k gives the CRC contribution of a byte
+    followed by k zero bytes.'''
+    if poly in crc16_tables:
+        return crc16_tables[poly]
+    t0 = []
+    for b in range(256):
+        c = b
+        for _ in range(8):
+            if c & 0x0001:
+                c = (c >> 1) ^ poly
+            else:
+                c >>= 1
+        t0.append(c)
+    tables = [t0]
+    for k in range(1, 8):
+        tables.append([(c >> 8) ^ t0[c & 0xFF] for c in tables[k-1]])
+    crc16_tables[poly] = tables
+    return tables
+
+
+def crc16_select_slicing(size):
+    '''Get the slicing mode (1, 4 or 8 bytes per step) to use for the provided data size.'''
+    if size >= SLICING_8_MIN_SIZE:
+        return 8
+    if size >= SLICING_4_MIN_SIZE:
+        return 4
+    return 1
+
+
+def crc16_update(crc, data, tables, slicing=None):
+    '''Feed data into a raw CRC-16 register (no final complement applied) using the lookup
+    tables. The slicing mode (1, 4 or 8) is selected from data size if not specified (None).'''
+    data = memoryview(data).cast("B")
+    size = len(data)
+    if slicing is None:
+        slicing = crc16_select_slicing(size)
+    t0, t1, t2, t3, t4, t5, t6, t7 = tables
+    i = 0
+    if slicing == 8:
+        i = size - (size % 8)
+        for w, d2, d3, d4, d5, d6, d7 in iter_unpack("<H6B", data[:i]):
+            x = crc ^ w
+            crc = t7[x & 0xFF] ^ t6[x >> 8] ^ t5[d2] ^ t4[d3] ^ t3[d4] ^ t2[d5] ^ t1[d6] ^ t0[d7]
+    elif slicing == 4:
+        i = size - (size % 4)
+        for w, d2, d3 in iter_unpack("<H2B", data[:i]):
+            x = crc ^ w
+            crc = t3[x & 0xFF] ^ t2[x >> 8] ^ t1[d2] ^ t0[d3]
+    for b in data[i:]:
+        crc = (crc >> 8) ^ t0[(crc ^ b) & 0xFF]
+    return crc
+
+
+def crc16_fast(data, poly, init = 0xFFFF, reverse=False, slicing=None):
+    '''Table-driven CRC-16-CCITT Algorithm (same result than crc16()).'''
+    tables = crc16_get_tables(poly)
+    crc = crc16_update(init & 0xFFFF, data, tables, slicing)
+    crc = (~crc & 0xFFFF)
+    if reverse:
+        crc = (crc << 8) | ((crc >> 8) & 0xFF)
+    return crc & 0xFFFF
+
+
+def crc16_update_stream(crc, f, tables):
+    '''Feed all the data of a binary file object into a raw CRC-16 register, reading it by
+    fixed size chunks into a reused buffer (flat memory usage whatever the file size is).'''
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        read_bytes = f.readinto(buf)
+        if not read_bytes:
+            break
+        crc = crc16_update(crc, view[:read_bytes], tables)
+    return crc
+
+
+def crc16_update_mmap(crc, f, tables):
+    '''Feed all the data of a binary file object into a raw CRC-16 register, through a memory
+    mapped view of the file processed by chunks (no data copies).'''
+    with mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for i in range(0, len(view), CHUNK_SIZE):
+                crc = crc16_update(crc, view[i:i+CHUNK_SIZE], tables)
+    return crc
+
+
+def gf2_matrix_times(mat, vec):
+    '''Multiply a GF(2) matrix (list of columns) by a vector.'''
+    result = 0
+    i = 0
+    while vec:
+        if vec & 0x01:
+            result ^= mat[i]
+        vec >>= 1
+        i += 1
+    return result
+
+
+def gf2_matrix_square(mat):
+    '''Square a GF(2) matrix (list of columns).'''
+    return [gf2_matrix_times(mat, col) for col in mat]
+
+
+def crc16_shift(crc, num_bytes, poly=CRC16_CCITT_POLY):
+    '''Get the raw CRC-16 register that results of feeding num_bytes zero bytes to crc, in
+    O(log(num_bytes)) through GF(2) matrix exponentiation (zlib crc32_combine technique).'''
+    # Operator matrix for a single zero bit, then for a zero byte
+    op = [poly] + [1 << (i-1) for i in range(1, 16)]
+    for _ in range(3):
+        op = gf2_matrix_square(op)
+    # Apply the operator matrix of num_bytes zero bytes
+    while num_bytes:
+        if num_bytes & 0x01:
+            crc = gf2_matrix_times(op, crc)
+        num_bytes >>= 1
+        if num_bytes:
+            op = gf2_matrix_square(op)
+    return crc
+
+
+def crc16_combine(crc1, crc2, len2, poly=CRC16_CCITT_POLY):
+    '''Combine the raw CRC-16 register of a data block (crc1) and the raw register of the next
+    len2 bytes data block calculated with zero init (crc2), into the raw register of both.'''
+    return crc16_shift(crc1, len2, poly) ^ crc2
+
+
+def crc16_range_worker(file_path, start, end, poly):
+    '''Parallel mode worker: get the raw CRC-16 register (zero init) of a file bytes range.'''
+    tables = crc16_get_tables(poly)
+    crc = 0
+    with open(file_path, "rb") as f:
+        with mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                for i in range(start, end, CHUNK_SIZE):
+                    crc = crc16_update(crc, view[i:min(i+CHUNK_SIZE, end)], tables)
+    return crc
+
+
+def crc16_file(file_path, poly=CRC16_CCITT_POLY, init=0xFFFF, reverse=False, use_mmap=False):
+    '''Get the CRC-16-CCITT of a file by streaming it (file path "-" reads from stdin).'''
+    tables = crc16_get_tables(poly)
+    crc = init & 0xFFFF
+    if file_path == "-":
+        crc = crc16_update_stream(crc, stdin.buffer, tables)
+    else:
+        with open(file_path, "rb") as f:
+            # Empty files can't be memory mapped
+            if use_mmap and (fstat(f.fileno()).st_size > 0):
+                crc = crc16_update_mmap(crc, f, tables)
+            else:
+                crc = crc16_update_stream(crc, f, tables)
+    crc = (~crc & 0xFFFF)
+    if reverse:
+        crc = (crc << 8) | ((crc >> 8) & 0xFF)
+    return crc & 0xFFFF
+
+
+def crc16_file_parallel(file_path, poly=CRC16_CCITT_POLY, init=0xFFFF, reverse=False,
+        num_workers=None):
+    '''Get the CRC-16-CCITT of a file splitting it in ranges that are calculated in a pool of
+    processes and combined into the same result of the serial calculation.'''
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    if file_path == "-":
+        return crc16_file(file_path, poly, init, reverse)
+    size = stat(file_path).st_size
+    if (num_workers == 1) or (size < PARALLEL_MIN_SIZE):
+        return crc16_file(file_path, poly, init, reverse)
+    range_size = -(-size // num_workers)
+    l_starts = list(range(0, size, range_size))
+    l_ends = [min(start+range_size, size) for start in l_starts]
+    n = len(l_starts)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        l_crcs = list(executor.map(crc16_range_worker, [file_path]*n, l_starts, l_ends,
+                [poly]*n))
+    crc = init & 0xFFFF
+    for range_crc, start, end in zip(l_crcs, l_starts, l_ends):
+        crc = crc16_combine(crc, range_crc, end-start, poly)
+    crc = (~crc & 0xFFFF)
+    if reverse:
+        crc = (crc << 8) | ((crc >> 8) & 0xFF)
+    return crc & 0xFFFF
+
+####################################################################################################
+
+### Classes ###
+
+class CRC16CCITT(object):
+    '''Incremental CRC-16-CCITT object that follows the hashlib protocol (update, digest,
+    hexdigest and copy). Any buffer-protocol object can be provided to update() without
+    copying it.'''
+
+    name = "crc16-ccitt"
+    digest_size = 2
+    block_size = 1
+
+    def __init__(self, data=b"", poly=CRC16_CCITT_POLY, init=0xFFFF, reverse=False):
+        '''Class Constructor'''
+        self.poly = poly
+        self.reverse = reverse
+        self.tables = crc16_get_tables(poly)
+        self.crc = init & 0xFFFF
+        self.update(data)
+
+
+    def update(self, data):
+        '''Feed more data into the CRC.'''
+        self.crc = crc16_update(self.crc, data, self.tables)
+
+
+    def intdigest(self):
+        '''Get the CRC value of the data fed so far as an integer.'''
+        crc = (~self.crc & 0xFFFF)
+        if self.reverse:
+            crc = (crc << 8) | ((crc >> 8) & 0xFF)
+        return crc & 0xFFFF
+
+
+    def digest(self):
+        '''Get the CRC value of the data fed so far as big-endian bytes.'''
+        return self.intdigest().to_bytes(self.digest_size, "big")
+
+
+    def hexdigest(self):
+        '''Get the CRC value of the data fed so far as hexadecimal string.'''
+        return "{:04x}".format(self.intdigest())
+
+
+    def copy(self):
+        '''Get a copy of the CRC object (state included).'''
+        other = CRC16CCITT.__new__(CRC16CCITT)
+        other.__dict__.update(self.__dict__)
+        return other
+
 ####################################################################################################
 
 ### Main and Finish Functions ###
@@ -62,14 +339,17 @@ def crc16(data, poly, init = 0xFFFF, reverse=False):
 def main():
     '''Main Function.'''
     try:
-        # Get provided file path argument
+        # Get provided file path argument and options
         argv = get_and_check_args()
         file_path = argv[0]
-        # Read the file
-        with open(file_path, "rb") as f:
-            _bytes = f.read()
+        use_mmap = ("--mmap" in argv[1:])
+        num_workers = get_option_value(argv[1:], "-j")
         # Get the CRC-16-CCITT value and print it as hexadecimal string with leading zeros
-        crc_value = crc16(_bytes, CRC16_CCITT_POLY)
+        if num_workers is not None:
+            crc_value = crc16_file_parallel(file_path, CRC16_CCITT_POLY,
+                    num_workers=int(num_workers))
+        else:
+            crc_value = crc16_file(file_path, CRC16_CCITT_POLY, use_mmap=use_mmap)
         crc_value = "{:04X}".format(crc_value)
         crc_value = "0x{}".format(crc_value.upper())
         print(crc_value)
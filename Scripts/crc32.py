@@ -7,6 +7,11 @@
 
 from sys import exit
 from sys import argv as sys_argv
+from sys import stdin
+from os import stat, fstat, cpu_count
+from concurrent.futures import ProcessPoolExecutor
+from mmap import mmap, ACCESS_READ
+from struct import iter_unpack
 from traceback import format_exc
 from signal import signal, SIGTERM, SIGINT
 
@@ -17,6 +22,22 @@ from signal import signal, SIGTERM, SIGINT
 FILE_NAME = sys_argv[0]
 CRC32_POLY = 0x04c11db7
 
+# Minimum data size to use slicing-by-8 instead of single table lookup
+SLICING_MIN_SIZE = 64
+
+# Minimum file size to split it between multiple processes in parallel mode
+PARALLEL_MIN_SIZE = 4*1024*1024
+
+# Chunk size used to read files in streaming mode (multiple of 8 for slicing)
+CHUNK_SIZE = 1024*1024
+
+####################################################################################################
+
+### Globals ###
+
+# CRC-32 lookup tables cache, keyed by (poly, reflect)
+crc32_tables = {}
+
 ####################################################################################################
 
 ### Functions ###
@@ -31,11 +52,29 @@ def get_and_check_args():
     return argv[1:]
 
 
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-j 4"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
 def print_script_usage():
     '''Function that shows script usage help.'''
-    print("You need to provide a file.")
-    print("Example:")
+    print("You need to provide a file (or \"-\" to read from stdin).")
+    print("Options:")
+    print("  --mmap  Memory-map the file instead of reading it by chunks.")
+    print("  -j N    Split the file between N processes (0 for all the CPU cores).")
+    print("Examples:")
     print("  python {} file.bin".format(FILE_NAME))
+    print("  python {} file.bin --mmap".format(FILE_NAME))
+    print("  python {} file.bin -j 0".format(FILE_NAME))
+    print("  cat file.bin | python {} -".format(FILE_NAME))
     print("")
 
 
@@ -57,6 +96,253 @@ def crc32b(data, poly, init = 0xFFFFFFFF, xorout = 0x00):
     crc = crc ^ xorout
     return crc
 
+
+def reflect_bits(value, num_bits):
+    '''Reverse the bits order of a value with the provided number of bits.'''
+    result = 0
+    for _ in range(num_bits):
+        result = (result << 1) | (value & 0x01)
+        value >>= 1
+    return result
+
+
+def crc32_get_tables(poly, reflect=False):
+    '''Get the 8 slicing lookup tables for a CRC-32 poly (built once and cached).
+    Table 0 is the classic 256 entries byte table, table k gives the CRC contribution of a byte
+    followed by k zero bytes.'''
+    key = (poly, reflect)
+    if key in crc32_tables:
+        return crc32_tables[key]
+    t0 = []
+    if reflect:
+        rpoly = reflect_bits(poly, 32)
+        for b in range(256):
+            c = b
+            for _ in range(8):
+                if c & 0x01:
+                    c = (c >> 1) ^ rpoly
+                else:
+                    c >>= 1
+            t0.append(c)
+    else:
+        for b in range(256):
+            t0.append(make_word(b, poly))
+    tables = [t0]
+    for k in range(1, 8):
+        prev = tables[k-1]
+        if reflect:
+            tables.append([(c >> 8) ^ t0[c & 0xFF] for c in prev])
+        else:
+            tables.append([(c << 8 & 0xFFFFFFFF) ^ t0[c >> 24] for c in prev])
+    crc32_tables[key] = tables
+    return tables
+
+
+def crc32_update(crc, data, tables, reflect=False, slicing=None):
+    '''Feed data into a raw CRC-32 register (no init/xorout applied) using the lookup tables.
+    Slicing-by-8 is used for large inputs if slicing is not specified (None).'''
+    data = memoryview(data).cast("B")
+    size = len(data)
+    if slicing is None:
+        slicing = (size >= SLICING_MIN_SIZE)
+    t0 = tables[0]
+    i = 0
+    if slicing:
+        t1, t2, t3, t4, t5, t6, t7 = tables[1:]
+        i = size - (size % 8)
+        if reflect:
+            for w, d4, d5, d6, d7 in iter_unpack("<I4B", data[:i]):
+                x = crc ^ w
+                crc = t7[x & 0xFF] ^ t6[(x >> 8) & 0xFF] ^ t5[(x >> 16) & 0xFF] ^ t4[x >> 24] \
+                    ^ t3[d4] ^ t2[d5] ^ t1[d6] ^ t0[d7]
+        else:
+            for w, d4, d5, d6, d7 in iter_unpack(">I4B", data[:i]):
+                x = crc ^ w
+                crc = t7[x >> 24] ^ t6[(x >> 16) & 0xFF] ^ t5[(x >> 8) & 0xFF] ^ t4[x & 0xFF] \
+                    ^ t3[d4] ^ t2[d5] ^ t1[d6] ^ t0[d7]
+    if reflect:
+        for b in data[i:]:
+            crc = (crc >> 8) ^ t0[(crc ^ b) & 0xFF]
+    else:
+        for b in data[i:]:
+            crc = (crc << 8 & 0xFFFFFFFF) ^ t0[(crc >> 24) ^ b]
+    return crc
+
+
+def crc32_fast(data, poly=CRC32_POLY, init=0xFFFFFFFF, xorout=0x00, reflect=False, slicing=None):
+    '''Table-driven CRC-32 (same result than crc32b() for non reflected calculation).'''
+    tables = crc32_get_tables(poly, reflect)
+    crc = crc32_update(init & 0xFFFFFFFF, data, tables, reflect, slicing)
+    return crc ^ xorout
+
+
+def crc32_update_stream(crc, f, tables, reflect=False):
+    '''Feed all the data of a binary file object into a raw CRC-32 register, reading it by
+    fixed size chunks into a reused buffer (flat memory usage whatever the file size is).'''
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        read_bytes = f.readinto(buf)
+        if not read_bytes:
+            break
+        crc = crc32_update(crc, view[:read_bytes], tables, reflect)
+    return crc
+
+
+def crc32_update_mmap(crc, f, tables, reflect=False):
+    '''Feed all the data of a binary file object into a raw CRC-32 register, through a memory
+    mapped view of the file processed by chunks (no data copies).'''
+    with mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for i in range(0, len(view), CHUNK_SIZE):
+                crc = crc32_update(crc, view[i:i+CHUNK_SIZE], tables, reflect)
+    return crc
+
+
+def crc32_file(file_path, poly=CRC32_POLY, init=0xFFFFFFFF, xorout=0x00, reflect=False,
+        use_mmap=False):
+    '''Get the CRC-32 of a file by streaming it (file path "-" reads from stdin).'''
+    tables = crc32_get_tables(poly, reflect)
+    crc = init & 0xFFFFFFFF
+    if file_path == "-":
+        return crc32_update_stream(crc, stdin.buffer, tables, reflect) ^ xorout
+    with open(file_path, "rb") as f:
+        # Empty files can't be memory mapped
+        if use_mmap and (fstat(f.fileno()).st_size > 0):
+            crc = crc32_update_mmap(crc, f, tables, reflect)
+        else:
+            crc = crc32_update_stream(crc, f, tables, reflect)
+    return crc ^ xorout
+
+
+def gf2_matrix_times(mat, vec):
+    '''Multiply a GF(2) matrix (list of columns) by a vector.'''
+    result = 0
+    i = 0
+    while vec:
+        if vec & 0x01:
+            result ^= mat[i]
+        vec >>= 1
+        i += 1
+    return result
+
+
+def gf2_matrix_square(mat):
+    '''Square a GF(2) matrix (list of columns).'''
+    return [gf2_matrix_times(mat, col) for col in mat]
+
+
+def crc32_shift(crc, num_bytes, poly=CRC32_POLY, reflect=False):
+    '''Get the raw CRC-32 register that results of feeding num_bytes zero bytes to crc, in
+    O(log(num_bytes)) through GF(2) matrix exponentiation (zlib crc32_combine technique).'''
+    # Operator matrix for a single zero bit
+    if reflect:
+        rpoly = reflect_bits(poly, 32)
+        op = [rpoly] + [1 << (i-1) for i in range(1, 32)]
+    else:
+        op = [(1 << (i+1)) for i in range(31)] + [poly]
+    # Operator matrix for a zero byte
+    for _ in range(3):
+        op = gf2_matrix_square(op)
+    # Apply the operator matrix of num_bytes zero bytes
+    while num_bytes:
+        if num_bytes & 0x01:
+            crc = gf2_matrix_times(op, crc)
+        num_bytes >>= 1
+        if num_bytes:
+            op = gf2_matrix_square(op)
+    return crc
+
+
+def crc32_combine(crc1, crc2, len2, poly=CRC32_POLY, reflect=False):
+    '''Combine the raw CRC-32 register of a data block (crc1) and the raw register of the next
+    len2 bytes data block calculated with zero init (crc2), into the raw register of both.'''
+    return crc32_shift(crc1, len2, poly, reflect) ^ crc2
+
+
+def crc32_range_worker(file_path, start, end, poly, reflect):
+    '''Parallel mode worker: get the raw CRC-32 register (zero init) of a file bytes range.'''
+    tables = crc32_get_tables(poly, reflect)
+    crc = 0
+    with open(file_path, "rb") as f:
+        with mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                for i in range(start, end, CHUNK_SIZE):
+                    crc = crc32_update(crc, view[i:min(i+CHUNK_SIZE, end)], tables, reflect)
+    return crc
+
+
+def crc32_file_parallel(file_path, poly=CRC32_POLY, init=0xFFFFFFFF, xorout=0x00,
+        reflect=False, num_workers=None):
+    '''Get the CRC-32 of a file splitting it in ranges that are calculated in a pool of
+    processes and combined into the same result of the serial calculation.'''
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    if file_path == "-":
+        return crc32_file(file_path, poly, init, xorout, reflect)
+    size = stat(file_path).st_size
+    if (num_workers == 1) or (size < PARALLEL_MIN_SIZE):
+        return crc32_file(file_path, poly, init, xorout, reflect)
+    range_size = -(-size // num_workers)
+    l_starts = list(range(0, size, range_size))
+    l_ends = [min(start+range_size, size) for start in l_starts]
+    n = len(l_starts)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        l_crcs = list(executor.map(crc32_range_worker, [file_path]*n, l_starts, l_ends,
+                [poly]*n, [reflect]*n))
+    crc = init & 0xFFFFFFFF
+    for range_crc, start, end in zip(l_crcs, l_starts, l_ends):
+        crc = crc32_combine(crc, range_crc, end-start, poly, reflect)
+    return crc ^ xorout
+
+####################################################################################################
+
+### Classes ###
+
+class CRC32(object):
+    '''Incremental CRC-32 object that follows the hashlib protocol (update, digest, hexdigest
+    and copy). Any buffer-protocol object can be provided to update() without copying it.'''
+
+    name = "crc32"
+    digest_size = 4
+    block_size = 1
+
+    def __init__(self, data=b"", poly=CRC32_POLY, init=0xFFFFFFFF, xorout=0x00, reflect=False):
+        '''Class Constructor'''
+        self.poly = poly
+        self.xorout = xorout
+        self.reflect = reflect
+        self.tables = crc32_get_tables(poly, reflect)
+        self.crc = init & 0xFFFFFFFF
+        self.update(data)
+
+
+    def update(self, data):
+        '''Feed more data into the CRC.'''
+        self.crc = crc32_update(self.crc, data, self.tables, self.reflect)
+
+
+    def intdigest(self):
+        '''Get the CRC value of the data fed so far as an integer.'''
+        return self.crc ^ self.xorout
+
+
+    def digest(self):
+        '''Get the CRC value of the data fed so far as big-endian bytes.'''
+        return self.intdigest().to_bytes(self.digest_size, "big")
+
+
+    def hexdigest(self):
+        '''Get the CRC value of the data fed so far as hexadecimal string.'''
+        return "{:08x}".format(self.intdigest())
+
+
+    def copy(self):
+        '''Get a copy of the CRC object (state included).'''
+        other = CRC32.__new__(CRC32)
+        other.__dict__.update(self.__dict__)
+        return other
+
 ####################################################################################################
 
 ### Main and Finish Functions ###
@@ -64,14 +350,17 @@ def crc32b(data, poly, init = 0xFFFFFFFF, xorout = 0x00):
 def main():
     '''Main Function.'''
     try:
-        # Get provided file path argument
+        # Get provided file path argument and options
         argv = get_and_check_args()
         file_path = argv[0]
-        # Read the file
-        with open(file_path, "rb") as f:
-            _bytes = f.read()
+        use_mmap = ("--mmap" in argv[1:])
+        num_workers = get_option_value(argv[1:], "-j")
         # Get the CRC-32 value and print it as hexadecimal string with leading zeros
-        crc_value = crc32b(_bytes, CRC32_POLY, 0x00, 0x00)
+        if num_workers is not None:
+            crc_value = crc32_file_parallel(file_path, CRC32_POLY, 0x00, 0x00,
+                    num_workers=int(num_workers))
+        else:
+            crc_value = crc32_file(file_path, CRC32_POLY, 0x00, 0x00, use_mmap=use_mmap)
         crc_value = "{:08X}".format(crc_value)
         crc_value = "0x{}".format(crc_value.upper())
         print(crc_value)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Description: Benchmark and correctness suite of the CRC engines of crc32.py, crc16ccitt.py and
+# crcmodel.py, cross-checked against zlib/binascii references.
+
+####################################################################################################
+
+### Libraries ###
+
+from sys import exit
+from sys import argv as sys_argv
+from sys import version as sys_version
+from os import remove, cpu_count
+from time import perf_counter, strftime
+from random import Random
+from platform import platform
+from tempfile import NamedTemporaryFile
+from json import dumps as json_dumps
+from traceback import format_exc
+from signal import signal, SIGTERM, SIGINT
+from zlib import crc32 as zlib_crc32
+from binascii import crc_hqx
+
+import crc32
+import crc16ccitt
+import crcmodel
+
+####################################################################################################
+
+### Constants ###
+
+FILE_NAME = sys_argv[0]
+
+# Benchmark data sizes (16 B to 1 GB)
+SIZES = [16, 256, 4*1024, 64*1024, 1024*1024, 16*1024*1024, 256*1024*1024, 1024*1024*1024]
+
+# Default maximum data size to benchmark
+DEFAULT_MAX_SIZE = 1024*1024
+
+# Minimum file size to split in parallel engines during the benchmark (the scripts default is
+# bigger than most benchmarked sizes, so the ranges combine path would not be measured)
+BENCH_PARALLEL_MIN_SIZE = 1
+
+# Maximum data size for bitwise (reference) engines, that are too slow for big data
+BITWISE_MAX_SIZE = 64*1024
+
+# Minimum measurement time of each engine and size (repeated runs, best one is taken)
+MIN_BENCH_TIME = 0.2
+
+# Seed for benchmark random data
+DATA_SEED = 0xC0FFEE
+
+# CRC check input of the catalogue models
+CHECK_INPUT = b"123456789"
+
+####################################################################################################
+
+### Functions ###
+
+def get_and_check_args():
+    '''Function that get and check provided script arguments.'''
+    argv = sys_argv[1:]
+    if ("-h" in argv) or ("--help" in argv):
+        print_script_usage()
+        finish(0)
+    return argv
+
+
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-o file"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
+def print_script_usage():
+    '''Function that shows script usage help.'''
+    print("Options:")
+    print("  --max-size N  Maximum data size in bytes to benchmark (default {}).".format(
+            DEFAULT_MAX_SIZE))
+    print("  -j N          Number of processes of the parallel engines (default all cores, at"
+            " least 2).")
+    print("  -o FILE       Write the results as JSON to FILE.")
+    print("Examples:")
+    print("  python {}".format(FILE_NAME))
+    print("  python {} --max-size 1073741824 -o crc_bench.json".format(FILE_NAME))
+    print("")
+
+
+def get_references():
+    '''Get the reference implementations used to check the engines results, as a dictionary
+    of name: (function, maximum data size or None if it is fast for any size, fallback function
+    for bigger sizes). Bitwise references fall back to the single table engines, that are
+    checked against them for small sizes.'''
+    poly32 = crc32.CRC32_POLY
+    poly16 = crc16ccitt.CRC16_CCITT_POLY
+    return {
+        "crc32b": (lambda data: crc32.crc32b(data, poly32, 0x00, 0x00), BITWISE_MAX_SIZE,
+                lambda data: crc32.crc32_fast(data, poly32, 0x00, 0x00, slicing=False)),
+        "crc16": (lambda data: crc16ccitt.crc16(data, poly16), BITWISE_MAX_SIZE,
+                lambda data: crc16ccitt.crc16_fast(data, poly16, slicing=1)),
+        "zlib.crc32": (lambda data: zlib_crc32(data), None, None),
+        "binascii.crc_hqx": (lambda data: crc_hqx(data, 0), None, None),
+    }
+
+
+def get_engines(num_workers):
+    '''Get the list of benchmarked engines as (name, kind, function, reference) tuples.
+    Function gets data bytes (or a file path for "file" kind engines) and returns the CRC;
+    reference is the name of the reference used to check its result. Parallel engines use at
+    least 2 processes, so files are always split.'''
+    num_workers = max(num_workers or cpu_count() or 1, 2)
+    poly32 = crc32.CRC32_POLY
+    poly16 = crc16ccitt.CRC16_CCITT_POLY
+    xmodem = crcmodel.crc_get_model("CRC-16/XMODEM")
+    iso_hdlc = crcmodel.crc_get_model("CRC-32/ISO-HDLC")
+    sdlc = crcmodel.crc_get_model("CRC-16/IBM-SDLC")
+    return [
+        ("crc32.bitwise", "bitwise",
+            lambda data: crc32.crc32b(data, poly32, 0x00, 0x00), None),
+        ("crc32.table", "data",
+            lambda data: crc32.crc32_fast(data, poly32, 0x00, 0x00, slicing=False),
+            "crc32b"),
+        ("crc32.slicing8", "data",
+            lambda data: crc32.crc32_fast(data, poly32, 0x00, 0x00, slicing=True),
+            "crc32b"),
+        ("crc32.slicing8.reflected", "data",
+            lambda data: crc32.crc32_fast(data, poly32, 0xFFFFFFFF, 0xFFFFFFFF, reflect=True),
+            "zlib.crc32"),
+        ("crc32.parallel", "file",
+            lambda file_path: crc32.crc32_file_parallel(file_path, poly32, 0x00, 0x00,
+                num_workers=num_workers),
+            "crc32b"),
+        ("crc16ccitt.bitwise", "bitwise",
+            lambda data: crc16ccitt.crc16(data, poly16), None),
+        ("crc16ccitt.table", "data",
+            lambda data: crc16ccitt.crc16_fast(data, poly16, slicing=1), "crc16"),
+        ("crc16ccitt.slicing4", "data",
+            lambda data: crc16ccitt.crc16_fast(data, poly16, slicing=4), "crc16"),
+        ("crc16ccitt.slicing8", "data",
+            lambda data: crc16ccitt.crc16_fast(data, poly16, slicing=8), "crc16"),
+        ("crc16ccitt.parallel", "file",
+            lambda file_path: crc16ccitt.crc16_file_parallel(file_path, poly16,
+                num_workers=num_workers),
+            "crc16"),
+        ("crcmodel.CRC-16/IBM-SDLC", "data", sdlc.calc, "crc16"),
+        ("crcmodel.CRC-16/XMODEM", "data", xmodem.calc, "binascii.crc_hqx"),
+        ("crcmodel.CRC-32/ISO-HDLC", "data", iso_hdlc.calc, "zlib.crc32"),
+    ]
+
+
+def check_catalogue():
+    '''Check all the crcmodel catalogue models against their check values.
+    Return the list of failed model names.'''
+    l_failed = []
+    for name in crcmodel.CRC_MODELS:
+        model = crcmodel.crc_get_model(name)
+        if model.calc(CHECK_INPUT) != model.check:
+            l_failed.append(name)
+    return l_failed
+
+
+def bench_run(function, arg):
+    '''Run a function repeatedly for at least MIN_BENCH_TIME seconds.
+    Return the result and the best run time.'''
+    best_time = None
+    total_time = 0.0
+    while total_time < MIN_BENCH_TIME:
+        t0 = perf_counter()
+        result = function(arg)
+        elapsed = perf_counter() - t0
+        total_time += elapsed
+        if (best_time is None) or (elapsed < best_time):
+            best_time = elapsed
+    return result, best_time
+
+
+def bench_size(engines, references, size, rnd):
+    '''Benchmark and check all the engines for a data size. Return a list of results.'''
+    results = []
+    data = rnd.randbytes(size)
+    file_path = None
+    # Reference results are computed once per size
+    ref_results = {}
+    for ref_name, (function, ref_max_size, fallback) in references.items():
+        if (ref_max_size is not None) and (size > ref_max_size):
+            function = fallback
+        ref_results[ref_name] = function(data)
+    try:
+        for name, kind, function, reference in engines:
+            if (kind == "bitwise") and (size > BITWISE_MAX_SIZE):
+                continue
+            if kind == "file":
+                if file_path is None:
+                    with NamedTemporaryFile(prefix="crcbench_", delete=False) as f:
+                        f.write(data)
+                        file_path = f.name
+                crc, seconds = bench_run(function, file_path)
+            else:
+                crc, seconds = bench_run(function, data)
+            ok = None
+            if reference is not None:
+                ok = (crc == ref_results[reference])
+            mbps = (size / seconds / 1e6) if seconds else 0.0
+            results.append({"engine": name, "size": size, "seconds": seconds, "mbps": mbps,
+                    "crc": crc, "reference": reference, "ok": ok})
+            print("{:<28} {:>12} B {:>10.2f} MB/s  {}".format(name, size, mbps,
+                    {True: "OK", False: "FAIL", None: "-"}[ok]))
+    finally:
+        if file_path is not None:
+            remove(file_path)
+    return results
+
+####################################################################################################
+
+### Main and Finish Functions ###
+
+def main():
+    '''Main Function.'''
+    try:
+        argv = get_and_check_args()
+        max_size = int(get_option_value(argv, "--max-size", DEFAULT_MAX_SIZE))
+        num_workers = int(get_option_value(argv, "-j", 0))
+        output_path = get_option_value(argv, "-o")
+        engines = get_engines(num_workers)
+        # Force parallel engines to split the file for every benchmarked size
+        crc32.PARALLEL_MIN_SIZE = BENCH_PARALLEL_MIN_SIZE
+        crc16ccitt.PARALLEL_MIN_SIZE = BENCH_PARALLEL_MIN_SIZE
+        references = get_references()
+        # Check catalogue models
+        l_failed = check_catalogue()
+        print("CRC catalogue check: {}".format("FAIL {}".format(l_failed) if l_failed else "OK"))
+        # Benchmark each size
+        rnd = Random(DATA_SEED)
+        results = []
+        for size in SIZES:
+            if size > max_size:
+                break
+            results.extend(bench_size(engines, references, size, rnd))
+        num_fails = len([result for result in results if result["ok"] is False])
+        print("")
+        print("Mismatches: {}".format(num_fails))
+        if output_path is not None:
+            report = {"timestamp": strftime("%Y-%m-%dT%H:%M:%S%z"), "python": sys_version,
+                    "platform": platform(), "catalogue_failed": l_failed, "results": results}
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(json_dumps(report, indent=2))
+            print("Results written to {}".format(output_path))
+        if num_fails or l_failed:
+            finish(1)
+    except Exception:
+        print("\n[ERROR]\n{}".format(format_exc()))
+        finish(1)
+    finish(0)
+
+
+def finish(return_code):
+    '''Finish function.'''
+    exit(return_code)
+
+####################################################################################################
+
+### Termination signals handler for program process ###
+
+def signal_handler(signal, frame):
+    '''Termination signals (SIGINT, SIGTERM) handler for program process'''
+    finish(1)
+
+
+# Signals attachment
+signal(SIGTERM, signal_handler) # SIGTERM (kill pid) to signal_handler
+signal(SIGINT, signal_handler)  # SIGINT (Ctrl+C) to signal_handler
+
+####################################################################################################
+
+### Script Input - Main Script ###
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        finish(0)
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Description: Generic parameterized CRC calculator (Rocksoft model) with a catalogue of named
+# CRC variants (CRC-8, CRC-16/MODBUS, CRC-16/XMODEM, CRC-32C, CRC-64/XZ...).
+
+####################################################################################################
+
+### Libraries ###
+
+from sys import exit
+from sys import argv as sys_argv
+from sys import stdin, stdout
+from os import stat, walk, replace, cpu_count
+from os import path as os_path
+from glob import glob
+from json import dumps as json_dumps
+from json import load as json_load
+from csv import writer as csv_writer
+from concurrent.futures import ProcessPoolExecutor
+from traceback import format_exc
+from signal import signal, SIGTERM, SIGINT
+
+# Table/slicing engines of CRC-32 and reflected CRC-16 models
+from crc32 import crc32_get_tables, crc32_update
+from crc16ccitt import crc16_get_tables, crc16_update
+
+# NumPy is optional, it is used to vectorize the batch API if available
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+####################################################################################################
+
+### Constants ###
+
+FILE_NAME = sys_argv[0]
+
+# Chunk size used to read files in streaming mode
+CHUNK_SIZE = 1024*1024
+
+# Number of files sent to each worker process at once in batch mode
+BATCH_FILES_PER_TASK = 16
+
+# Minimum number of packets of the same length to use NumPy vectorization in batch API
+NUMPY_MIN_PACKETS = 32
+
+# CRC models catalogue (Rocksoft model parameters and check value of b"123456789")
+CRC_MODELS = {
+    "CRC-5/USB":          dict(width=5,  poly=0x05, init=0x1F, refin=True, refout=True,
+                               xorout=0x1F, check=0x19),
+    "CRC-7/MMC":          dict(width=7,  poly=0x09, init=0x00, refin=False, refout=False,
+                               xorout=0x00, check=0x75),
+    "CRC-8/SMBUS":        dict(width=8,  poly=0x07, init=0x00, refin=False, refout=False,
+                               xorout=0x00, check=0xF4),
+    "CRC-8/MAXIM-DOW":    dict(width=8,  poly=0x31, init=0x00, refin=True, refout=True,
+                               xorout=0x00, check=0xA1),
+    "CRC-8/AUTOSAR":      dict(width=8,  poly=0x2F, init=0xFF, refin=False, refout=False,
+                               xorout=0xFF, check=0xDF),
+    "CRC-16/ARC":         dict(width=16, poly=0x8005, init=0x0000, refin=True, refout=True,
+                               xorout=0x0000, check=0xBB3D),
+    "CRC-16/MODBUS":      dict(width=16, poly=0x8005, init=0xFFFF, refin=True, refout=True,
+                               xorout=0x0000, check=0x4B37),
+    "CRC-16/USB":         dict(width=16, poly=0x8005, init=0xFFFF, refin=True, refout=True,
+                               xorout=0xFFFF, check=0xB4C8),
+    "CRC-16/XMODEM":      dict(width=16, poly=0x1021, init=0x0000, refin=False, refout=False,
+                               xorout=0x0000, check=0x31C3),
+    "CRC-16/KERMIT":      dict(width=16, poly=0x1021, init=0x0000, refin=True, refout=True,
+                               xorout=0x0000, check=0x2189),
+    "CRC-16/IBM-3740":    dict(width=16, poly=0x1021, init=0xFFFF, refin=False, refout=False,
+                               xorout=0x0000, check=0x29B1),
+    "CRC-16/IBM-SDLC":    dict(width=16, poly=0x1021, init=0xFFFF, refin=True, refout=True,
+                               xorout=0xFFFF, check=0x906E),
+    "CRC-16/DNP":         dict(width=16, poly=0x3D65, init=0x0000, refin=True, refout=True,
+                               xorout=0xFFFF, check=0xEA82),
+    "CRC-32/ISO-HDLC":    dict(width=32, poly=0x04C11DB7, init=0xFFFFFFFF, refin=True,
+                               refout=True, xorout=0xFFFFFFFF, check=0xCBF43926),
+    "CRC-32/BZIP2":       dict(width=32, poly=0x04C11DB7, init=0xFFFFFFFF, refin=False,
+                               refout=False, xorout=0xFFFFFFFF, check=0xFC891918),
+    "CRC-32/MPEG-2":      dict(width=32, poly=0x04C11DB7, init=0xFFFFFFFF, refin=False,
+                               refout=False, xorout=0x00000000, check=0x0376E6E7),
+    "CRC-32/CKSUM":       dict(width=32, poly=0x04C11DB7, init=0x00000000, refin=False,
+                               refout=False, xorout=0xFFFFFFFF, check=0x765E7680),
+    "CRC-32/CRC32-PY":    dict(width=32, poly=0x04C11DB7, init=0x00000000, refin=False,
+                               refout=False, xorout=0x00000000, check=0x89A1897F),
+    "CRC-32/ISCSI":       dict(width=32, poly=0x1EDC6F41, init=0xFFFFFFFF, refin=True,
+                               refout=True, xorout=0xFFFFFFFF, check=0xE3069283),
+    "CRC-64/ECMA-182":    dict(width=64, poly=0x42F0E1EBA9EA3693, init=0x0, refin=False,
+                               refout=False, xorout=0x0, check=0x6C40DF5F0B497347),
+    "CRC-64/XZ":          dict(width=64, poly=0x42F0E1EBA9EA3693, init=0xFFFFFFFFFFFFFFFF,
+                               refin=True, refout=True, xorout=0xFFFFFFFFFFFFFFFF,
+                               check=0x995DC9BBDF1939FA),
+}
+
+# Common alias names of catalogue models
+CRC_ALIASES = {
+    "CRC-8": "CRC-8/SMBUS",
+    "CRC-8/MAXIM": "CRC-8/MAXIM-DOW",
+    "CRC-16": "CRC-16/ARC",
+    "CRC-16/CCITT-FALSE": "CRC-16/IBM-3740",
+    "CRC-16/X-25": "CRC-16/IBM-SDLC",
+    "CRC16CCITT.PY": "CRC-16/IBM-SDLC",
+    "CRC-32": "CRC-32/ISO-HDLC",
+    "CRC-32C": "CRC-32/ISCSI",
+    "CRC-32/POSIX": "CRC-32/CKSUM",
+    "CRC32.PY": "CRC-32/CRC32-PY",
+}
+
+####################################################################################################
+
+### Globals ###
+
+# CRC lookup tables cache, keyed by (width, poly, refin)
+crc_tables = {}
+
+####################################################################################################
+
+### Functions ###
+
+def get_and_check_args():
+    '''Function that get and check provided script arguments.'''
+    argv = sys_argv
+    argc = len(sys_argv)-1
+    if argc == 0:
+        print_script_usage()
+        finish(1)
+    if (argv[1] != "--list") and (argc < 2):
+        print_script_usage()
+        finish(1)
+    return argv[1:]
+
+
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-j 4"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
+def get_positional_args(argv, options_with_value):
+    '''Get the arguments that are not options nor options values.'''
+    l_args = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg in options_with_value:
+            skip_next = True
+            continue
+        if arg.startswith("--"):
+            continue
+        l_args.append(arg)
+    return l_args
+
+
+def print_script_usage():
+    '''Function that shows script usage help.'''
+    print("You need to provide a CRC model name and a file (or \"-\" to read from stdin).")
+    print("Examples:")
+    print("  python {} CRC-16/MODBUS file.bin".format(FILE_NAME))
+    print("  cat file.bin | python {} CRC-32C -".format(FILE_NAME))
+    print("  python {} --list".format(FILE_NAME))
+    print("")
+    print("Batch mode (many files, directories or globs, to a CSV or JSON lines manifest):")
+    print("  python {} CRC-32 --batch dir/ \"out/**/*.bin\" [-l files.txt] [-j N]".format(
+            FILE_NAME))
+    print("      [-o manifest.jsonl|manifest.csv] [--cache crc_cache.json]")
+    print("")
+
+
+def reflect_bits(value, num_bits):
+    '''Reverse the bits order of a value with the provided number of bits.'''
+    result = 0
+    for _ in range(num_bits):
+        result = (result << 1) | (value & 0x01)
+        value >>= 1
+    return result
+
+
+def crc_get_table(width, poly, refin):
+    '''Get the 256 entries lookup table of a CRC (built once and cached).
+    Non reflected CRCs narrower than 8 bits use a register left aligned to 8 bits.'''
+    key = (width, poly, refin)
+    if key in crc_tables:
+        return crc_tables[key]
+    table = []
+    if refin:
+        rpoly = reflect_bits(poly, width)
+        for b in range(256):
+            c = b
+            for _ in range(8):
+                if c & 0x01:
+                    c = (c >> 1) ^ rpoly
+                else:
+                    c >>= 1
+            table.append(c)
+    else:
+        reg_width = max(width, 8)
+        reg_poly = poly << (reg_width - width)
+        top_bit = 1 << (reg_width - 1)
+        mask = (1 << reg_width) - 1
+        for b in range(256):
+            c = b << (reg_width - 8)
+            for _ in range(8):
+                if c & top_bit:
+                    c = ((c << 1) & mask) ^ reg_poly
+                else:
+                    c = (c << 1) & mask
+            table.append(c)
+    crc_tables[key] = table
+    return table
+
+
+def crc_get_model(name):
+    '''Get a CRC model from the catalogue by its name or alias (case insensitive).'''
+    name = name.upper()
+    name = CRC_ALIASES.get(name, name)
+    if name not in CRC_MODELS:
+        raise ValueError("Unknown CRC model \"{}\"".format(name))
+    return CrcModel(name=name, **CRC_MODELS[name])
+
+
+def crc_calc(model_name, data):
+    '''Get the CRC of data for a catalogue CRC model name.'''
+    return crc_get_model(model_name).calc(data)
+
+
+def crc_batch(model_name, packets):
+    '''Get the CRCs of a list of packets for a catalogue CRC model name.'''
+    return crc_get_model(model_name).batch(packets)
+
+
+def batch_expand_paths(l_inputs):
+    '''Expand a list of files, directories (recursive) and glob patterns into a list of file
+    paths without duplicates.'''
+    l_paths = []
+    for item in l_inputs:
+        if os_path.isdir(item):
+            for root, _, l_files in walk(item):
+                for file_name in sorted(l_files):
+                    l_paths.append(os_path.join(root, file_name))
+        elif any(c in item for c in "*?["):
+            l_paths.extend([p for p in sorted(glob(item, recursive=True)) if os_path.isfile(p)])
+        else:
+            l_paths.append(item)
+    return list(dict.fromkeys(l_paths))
+
+
+def batch_read_file_list(file_path):
+    '''Read a list of files (one per line) from a file or stdin ("-").'''
+    if file_path == "-":
+        return [line.strip() for line in stdin if line.strip()]
+    with open(file_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def batch_cache_load(cache_path):
+    '''Load the batch results cache, keyed by model and file absolute path.'''
+    if (cache_path is None) or (not os_path.exists(cache_path)):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json_load(f)
+    except Exception as e:
+        print("Ignoring invalid cache file \"{}\". {}".format(cache_path, str(e)))
+        return {}
+
+
+def batch_cache_save(cache_path, cache):
+    '''Save the batch results cache (written to a temporary file and then renamed).'''
+    if cache_path is None:
+        return
+    tmp_path = "{}.tmp".format(cache_path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json_dumps(cache))
+    replace(tmp_path, cache_path)
+
+
+def batch_file_worker(model_name, file_path):
+    '''Batch mode worker: get the CRC of a file (or the error message if it fails).'''
+    try:
+        model = crc_get_model(model_name)
+        with open(file_path, "rb") as f:
+            return (model.calc_stream(f), None)
+    except Exception as e:
+        return (None, str(e))
+
+
+def crc_batch_files(model_name, l_paths, num_workers=None, cache_path=None):
+    '''Get the CRCs of many files in a pool of processes. Files that are unchanged since the
+    last run (same size, mtime and inode in cache) are not read again.
+    Return a list of results dictionaries (path, size, crc, error).'''
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    model = crc_get_model(model_name)
+    cache = batch_cache_load(cache_path)
+    results = []
+    l_pending = []
+    for file_path in l_paths:
+        result = {"path": file_path, "size": None, "crc": None, "error": None}
+        results.append(result)
+        try:
+            st = stat(file_path)
+        except Exception as e:
+            result["error"] = str(e)
+            continue
+        result["size"] = st.st_size
+        key = "{}|{}".format(model.name, os_path.abspath(file_path))
+        file_id = [st.st_size, st.st_mtime_ns, st.st_ino]
+        cached = cache.get(key)
+        if (cached is not None) and (cached[:3] == file_id):
+            result["crc"] = cached[3]
+            continue
+        l_pending.append((result, key, file_id))
+    if l_pending:
+        n = len(l_pending)
+        l_files = [result["path"] for result, _, _ in l_pending]
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            l_crcs = executor.map(batch_file_worker, [model.name]*n, l_files,
+                    chunksize=BATCH_FILES_PER_TASK)
+            for (result, key, file_id), (crc, error) in zip(l_pending, l_crcs):
+                result["crc"] = crc
+                result["error"] = error
+                if error is None:
+                    cache[key] = file_id + [crc]
+    batch_cache_save(cache_path, cache)
+    return results
+
+
+def batch_write_manifest(results, model, output_path=None):
+    '''Write the batch results manifest as CSV (".csv" output file) or JSON lines.'''
+    num_digits = (model.width + 3) // 4
+    f = stdout
+    if output_path is not None:
+        f = open(output_path, "w", encoding="utf-8", newline="")
+    try:
+        use_csv = (output_path is not None) and output_path.lower().endswith(".csv")
+        if use_csv:
+            writer = csv_writer(f)
+            writer.writerow(["path", "size", "crc", "error"])
+        for result in results:
+            crc = result["crc"]
+            if crc is not None:
+                crc = "0x{:0{}X}".format(crc, num_digits)
+            if use_csv:
+                writer.writerow([result["path"], result["size"], crc, result["error"] or ""])
+            else:
+                f.write("{}\n".format(json_dumps({"path": result["path"], "size": result["size"],
+                        "crc": crc, "error": result["error"]})))
+    finally:
+        if f is not stdout:
+            f.close()
+
+####################################################################################################
+
+### Classes ###
+
+class CrcModel(object):
+    '''Rocksoft model CRC engine (width, poly, init, refin, refout, xorout) with a lazily built
+    and cached lookup table. 32 bits and reflected 16 bits models use the slicing engines of
+    crc32.py and crc16ccitt.py.'''
+
+    def __init__(self, width, poly, init=0x00, refin=False, refout=False, xorout=0x00,
+            check=None, name=None):
+        '''Class Constructor'''
+        if width < 1:
+            raise ValueError("CRC width must be positive")
+        self.name = name
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.poly = poly & self.mask
+        self.init = init & self.mask
+        self.refin = refin
+        self.refout = refout
+        self.xorout = xorout & self.mask
+        self.check = check
+        # Register shift for non reflected CRCs narrower than 8 bits
+        self.reg_shift = 0
+        if not refin:
+            self.reg_shift = max(8 - width, 0)
+        self._table = None
+        self._slicing_tables = None
+
+
+    @property
+    def table(self):
+        '''Lookup table of the model (built on first use).'''
+        if self._table is None:
+            self._table = crc_get_table(self.width, self.poly, self.refin)
+        return self._table
+
+
+    @property
+    def slicing_tables(self):
+        '''Slicing lookup tables of the crc32.py or crc16ccitt.py engine for the models
+        they cover (None for the others, built on first use).'''
+        if self._slicing_tables is None:
+            if self.width == 32:
+                self._slicing_tables = crc32_get_tables(self.poly, self.refin)
+            elif (self.width == 16) and self.refin:
+                self._slicing_tables = crc16_get_tables(reflect_bits(self.poly, 16))
+        return self._slicing_tables
+
+
+    def init_register(self):
+        '''Get the initial value of the CRC register.'''
+        if self.refin:
+            return reflect_bits(self.init, self.width)
+        return self.init << self.reg_shift
+
+
+    def update(self, crc, data):
+        '''Feed data into a CRC register.'''
+        if self.slicing_tables is not None:
+            if self.width == 32:
+                return crc32_update(crc, data, self.slicing_tables, self.refin)
+            return crc16_update(crc, data, self.slicing_tables)
+        table = self.table
+        if self.refin:
+            for b in memoryview(data).cast("B"):
+                crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+        else:
+            reg_width = self.width + self.reg_shift
+            top_shift = reg_width - 8
+            mask = (1 << reg_width) - 1
+            for b in memoryview(data).cast("B"):
+                crc = ((crc << 8) & mask) ^ table[((crc >> top_shift) ^ b) & 0xFF]
+        return crc
+
+
+    def finalize(self, crc):
+        '''Get the CRC value from a CRC register.'''
+        crc >>= self.reg_shift
+        if self.refin != self.refout:
+            crc = reflect_bits(crc, self.width)
+        return crc ^ self.xorout
+
+
+    def calc(self, data):
+        '''Get the CRC of data.'''
+        return self.finalize(self.update(self.init_register(), data))
+
+
+    def calc_stream(self, f):
+        '''Get the CRC of all the data of a binary file object, reading it by chunks.'''
+        crc = self.init_register()
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = self.update(crc, chunk)
+        return self.finalize(crc)
+
+
+    def batch(self, packets):
+        '''Get the CRCs of a list of packets in one call. Packets of the same length are
+        vectorized with NumPy when it is available.'''
+        packets = [bytes(packet) for packet in packets]
+        if (np is None) or (self.width + self.reg_shift > 64):
+            return [self.calc(packet) for packet in packets]
+        results = [None] * len(packets)
+        # Group packets indexes by length
+        length_groups = {}
+        for i, packet in enumerate(packets):
+            length_groups.setdefault(len(packet), []).append(i)
+        for length, l_indexes in length_groups.items():
+            if len(l_indexes) < NUMPY_MIN_PACKETS:
+                for i in l_indexes:
+                    results[i] = self.calc(packets[i])
+                continue
+            data = b"".join([packets[i] for i in l_indexes])
+            l_crcs = self._batch_numpy(data, len(l_indexes), length)
+            for i, crc in zip(l_indexes, l_crcs):
+                results[i] = self.finalize(crc)
+        return results
+
+
+    def _batch_numpy(self, data, num_packets, length):
+        '''Get the CRC registers of num_packets packets of the same length (joined in data)
+        running the table algorithm over all of them at once with NumPy.'''
+        table = np.array(self.table, dtype=np.uint64)
+        matrix = np.frombuffer(data, dtype=np.uint8).reshape(num_packets, length)
+        crc = np.full(num_packets, self.init_register(), dtype=np.uint64)
+        shift_8 = np.uint64(8)
+        byte_mask = np.uint64(0xFF)
+        if self.refin:
+            for col in range(length):
+                crc = (crc >> shift_8) ^ table[(crc ^ matrix[:, col]) & byte_mask]
+        else:
+            reg_width = self.width + self.reg_shift
+            top_shift = np.uint64(reg_width - 8)
+            mask = np.uint64((1 << reg_width) - 1)
+            for col in range(length):
+                crc = ((crc << shift_8) & mask) ^ table[((crc >> top_shift) ^ matrix[:, col])
+                        & byte_mask]
+        return [int(c) for c in crc.tolist()]
+
+####################################################################################################
+
+### Main and Finish Functions ###
+
+def main():
+    '''Main Function.'''
+    try:
+        argv = get_and_check_args()
+        # Show the catalogue of CRC models
+        if argv[0] == "--list":
+            for name, params in CRC_MODELS.items():
+                model = CrcModel(name=name, **params)
+                check_ok = (model.calc(b"123456789") == model.check)
+                print("{:<18} width={} poly=0x{:X} init=0x{:X} refin={} refout={} xorout=0x{:X}"
+                        " check=0x{:X} [{}]".format(name, model.width, model.poly, model.init,
+                        model.refin, model.refout, model.xorout, model.check,
+                        "OK" if check_ok else "FAIL"))
+            finish(0)
+        model = crc_get_model(argv[0])
+        # Batch mode
+        if "--batch" in argv:
+            options_with_value = ["-l", "-j", "-o", "--cache"]
+            l_inputs = get_positional_args(argv[1:], options_with_value)
+            file_list = get_option_value(argv, "-l")
+            if file_list is not None:
+                l_inputs.extend(batch_read_file_list(file_list))
+            num_workers = int(get_option_value(argv, "-j", 0))
+            output_path = get_option_value(argv, "-o")
+            cache_path = get_option_value(argv, "--cache")
+            l_paths = batch_expand_paths(l_inputs)
+            results = crc_batch_files(model.name, l_paths, num_workers, cache_path)
+            batch_write_manifest(results, model, output_path)
+            if any(result["error"] is not None for result in results):
+                finish(1)
+            finish(0)
+        file_path = argv[1]
+        # Get the CRC value and print it as hexadecimal string with leading zeros
+        if file_path == "-":
+            crc_value = model.calc_stream(stdin.buffer)
+        else:
+            with open(file_path, "rb") as f:
+                crc_value = model.calc_stream(f)
+        num_digits = (model.width + 3) // 4
+        print("0x{:0{}X}".format(crc_value, num_digits))
+    except Exception:
+        print("\n[ERROR]\n{}".format(format_exc()))
+        finish(1)
+    finish(0)
+
+
+def finish(return_code):
+    '''Finish function.'''
+    exit(return_code)
+
+####################################################################################################
+
+### Termination signals handler for program process ###
+
+def signal_handler(signal, frame):
+    '''Termination signals (SIGINT, SIGTERM) handler for program process'''
+    finish(1)
+
+
+# Signals attachment
+signal(SIGTERM, signal_handler) # SIGTERM (kill pid) to signal_handler
+signal(SIGINT, signal_handler)  # SIGINT (Ctrl+C) to signal_handler
+
+####################################################################################################
+
+### Script Input - Main Script ###
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        finish(0)
@@ -8,10 +8,44 @@
 
 from sys import exit
 from sys import argv as sys_argv
-from time import sleep
+from sys import stdin, stdout, stderr
+from os import cpu_count
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from traceback import format_exc
 from signal import signal, SIGTERM, SIGINT
+from re import compile as re_compile
 from base64 import b64encode
+from binascii import a2b_hex, b2a_base64
+
+####################################################################################################
+
+### Constants ###
+
+# Chunk size used to read input data in streaming mode
+CHUNK_SIZE = 4*1024*1024
+
+# Number of lines converted at once in line batch mode (and per worker process task)
+BATCH_LINES = 65536
+
+# Whitespace characters ignored from hexadecimal input data in streaming mode
+WHITESPACES = b" \t\r\n"
+
+# Valid hexadecimal digits
+HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+# Separators ignored from hexadecimal input data in tolerant mode
+HEX_SEPARATORS = b" \t\r\n:-"
+
+# "0x" prefixes ignored in tolerant mode (at data start or after a separator, before a digit),
+# for data that starts at the beginning of a hexadecimal token or in the middle of it
+HEX_PREFIX_RE = re_compile(rb"(?:^|(?<=[ \t\r\n:\-]))0[xX](?=[0-9a-fA-F])")
+HEX_PREFIX_MID_TOKEN_RE = re_compile(rb"(?<=[ \t\r\n:\-])0[xX](?=[0-9a-fA-F])")
+
+# Valid tokens in tolerant mode (separators or hexadecimal digits with optional "0x" prefix)
+HEX_TOKEN_RE = re_compile(rb"[ \t\r\n:\-]+|(?:0[xX])?[0-9a-fA-F]+")
+HEX_DIGITS_RE = re_compile(rb"[0-9a-fA-F]+")
 
 ####################################################################################################
 
@@ -33,6 +67,30 @@ def print_script_usage():
     print("You need to provide a valid hexadecimal string to be encoded.")
     print("Example:")
     print("  python hextob64.py c2889d8f")
+    print("  python hextob64.py --tolerant \"0xc2:88:9d:8f\"")
+    print("")
+    print("Streaming mode (convert a file or stdin \"-\", to a file or stdout):")
+    print("  python hextob64.py -f data.hex [-o data.b64]")
+    print("  cat data.hex | python hextob64.py -f -")
+    print("")
+    print("Line batch mode (one value per line from a file or stdin \"-\", one result per line):")
+    print("  python hextob64.py -l values.txt [-o results.txt] [-j N]")
+    print("  cat values.txt | python hextob64.py -l - -j 0")
+    print("")
+    print("The --tolerant option ignores whitespaces, \":\" and \"-\" separators and \"0x\"")
+    print("prefixes.")
+
+
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-f file"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
 
 
 def hex_add_left_zero_padding(input_str):
@@ -46,11 +104,174 @@ def hex_add_left_zero_padding(input_str):
 def string_is_hex(input_str):
     '''Function that check if provided string is a valid hexadecimal data.'''
     try:
-        int(input_str, 16)
-        return True
+        hex_digits, invalid_offset = hex_check(input_str.encode("ascii"))
+        return (invalid_offset < 0) and (len(hex_digits) > 0)
     except Exception as e:
         return False
 
+
+def hex_find_invalid(data, separators=b"", tolerant=False, at_token_start=True):
+    '''Get the offset of the first invalid character of hexadecimal data (bytes), or -1 if all
+    of them are valid. In tolerant mode "0x" prefixes and HEX_SEPARATORS are valid too.'''
+    if tolerant:
+        pos = 0
+        if not at_token_start:
+            match = HEX_DIGITS_RE.match(data)
+            if match:
+                pos = match.end()
+        while pos < len(data):
+            match = HEX_TOKEN_RE.match(data, pos)
+            if not match:
+                return pos
+            pos = match.end()
+        return -1
+    allowed = set(HEX_DIGITS + separators)
+    for i, c in enumerate(data):
+        if c not in allowed:
+            return i
+    return -1
+
+
+def hex_check(data, separators=b"", tolerant=False, at_token_start=True):
+    '''Check hexadecimal data (bytes) in linear time, removing the separators characters (and
+    "0x" prefixes and HEX_SEPARATORS in tolerant mode). The at_token_start argument tells if
+    data starts at the beginning of a token (data is a chunk of a bigger stream).
+    Return the cleaned hexadecimal digits and the offset of the first invalid character (-1 if
+    data is valid).'''
+    cleaned = data
+    if tolerant and ((b"0x" in data) or (b"0X" in data)):
+        if at_token_start:
+            cleaned = HEX_PREFIX_RE.sub(b"", cleaned)
+        else:
+            cleaned = HEX_PREFIX_MID_TOKEN_RE.sub(b"", cleaned)
+    if tolerant:
+        separators = HEX_SEPARATORS
+    if separators:
+        cleaned = cleaned.translate(None, separators)
+    # Fast path, all the characters are hexadecimal digits
+    if not cleaned.translate(None, HEX_DIGITS):
+        return cleaned, -1
+    return cleaned, hex_find_invalid(data, separators, tolerant, at_token_start)
+
+
+def hex_invalid_message(data, invalid_offset, base_offset=0):
+    '''Get the error message of an invalid hexadecimal character found in data (bytes).'''
+    return "Invalid hexadecimal character {} at offset {}".format(
+            repr(data[invalid_offset:invalid_offset+1])[1:], base_offset + invalid_offset)
+
+
+def hex_check_stream(f_in, separators=WHITESPACES, tolerant=False):
+    '''Read hexadecimal data from a binary file object by chunks and yield the cleaned
+    hexadecimal digits of each chunk (see hex_check()). Raise a ValueError with the offset and
+    character of the first invalid digit found.'''
+    offset = 0
+    pending = b""
+    at_token_start = True
+    eof = False
+    while not eof:
+        chunk = f_in.read(CHUNK_SIZE)
+        eof = not chunk
+        data = pending + chunk
+        if not data:
+            break
+        # In tolerant mode tokens must not be split between chunks, cut data after the last
+        # separator (or keep last bytes to check the "0x" prefix lookahead in long tokens)
+        cut = len(data)
+        if tolerant and (not eof):
+            cut = max(data.rfind(bytes([c])) for c in HEX_SEPARATORS) + 1
+            if cut == 0:
+                cut = max(len(data) - 2, 0)
+        data, pending = data[:cut], data[cut:]
+        cleaned, invalid_offset = hex_check(data, separators, tolerant, at_token_start)
+        if invalid_offset >= 0:
+            raise ValueError(hex_invalid_message(data, invalid_offset, offset))
+        if data:
+            at_token_start = (data[-1] in HEX_SEPARATORS)
+        offset += len(data)
+        yield cleaned
+
+
+def hex_to_b64_stream(f_in, f_out, tolerant=False):
+    '''Encode hexadecimal data from a binary file object into BASE64 in another binary file object.
+    Input is read by chunks and each chunk is converted aligned to 6 hex digits (3 bytes, a
+    BASE64 quantum), so memory usage is bounded whatever the data size is.'''
+    pending = b""
+    for chunk in hex_check_stream(f_in, WHITESPACES, tolerant):
+        chunk = pending + chunk
+        num_aligned = len(chunk) - (len(chunk) % 6)
+        pending = chunk[num_aligned:]
+        if num_aligned:
+            f_out.write(b2a_base64(a2b_hex(chunk[:num_aligned]), newline=False))
+    if len(pending) % 2:
+        raise ValueError("Odd number of hexadecimal digits in the input data")
+    if pending:
+        f_out.write(b2a_base64(a2b_hex(pending), newline=False))
+    f_out.write(b"\n")
+
+
+def hex_to_b64_value(value, tolerant=False):
+    '''Encode an hexadecimal value (bytes) into BASE64 (bytes), left padding with zero if odd.'''
+    hex_digits, invalid_offset = hex_check(value, tolerant=tolerant)
+    if invalid_offset >= 0:
+        raise ValueError(hex_invalid_message(value, invalid_offset))
+    if not hex_digits:
+        raise ValueError("No hexadecimal digits in the value")
+    if len(hex_digits) % 2:
+        hex_digits = b"0" + hex_digits
+    return b2a_base64(a2b_hex(hex_digits), newline=False)
+
+
+def hex_to_b64_lines(l_lines, tolerant=False):
+    '''Convert a block of hexadecimal values (bytes lines) into BASE64.
+    Return the output data (one result per line) and a list of (line index, error) of the
+    values that can't be converted (an empty line is written for them).'''
+    l_results = []
+    l_errors = []
+    for i, line in enumerate(l_lines):
+        value = line.strip()
+        if not value:
+            l_results.append(b"")
+            continue
+        try:
+            l_results.append(hex_to_b64_value(value, tolerant))
+        except Exception as e:
+            l_results.append(b"")
+            l_errors.append((i, str(e)))
+    l_results.append(b"")
+    return b"\n".join(l_results), l_errors
+
+
+def hex_to_b64_batch(f_in, f_out, num_workers=None, tolerant=False):
+    '''Convert hexadecimal values from a binary file object (one per line) into BASE64
+    results in another binary file object (one per line). Lines are processed by blocks, in a
+    pool of processes if num_workers is provided (0 for all the CPU cores), keeping a bounded
+    number of blocks in flight. Return the number of lines that can't be converted.'''
+    num_errors = 0
+    def write_block(block_index, result):
+        nonlocal num_errors
+        data, l_errors = result
+        f_out.write(data)
+        for i, error in l_errors:
+            stderr.write("Line {}: {}\n".format(block_index*BATCH_LINES + i + 1, error))
+        num_errors += len(l_errors)
+    blocks = iter(lambda: list(islice(f_in, BATCH_LINES)), [])
+    if num_workers is None:
+        for block_index, l_lines in enumerate(blocks):
+            write_block(block_index, hex_to_b64_lines(l_lines, tolerant))
+        return num_errors
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        in_flight = deque()
+        for block_index, l_lines in enumerate(blocks):
+            in_flight.append((block_index, executor.submit(hex_to_b64_lines, l_lines, tolerant)))
+            if len(in_flight) >= 2*num_workers:
+                done_index, future = in_flight.popleft()
+                write_block(done_index, future.result())
+        for done_index, future in in_flight:
+            write_block(done_index, future.result())
+    return num_errors
+
 ####################################################################################################
 
 ### Main and Finish Functions ###
@@ -59,13 +280,54 @@ def main():
     '''Main Function.'''
     try:
         argv = get_and_check_args()
-        hex_string = argv[0]
-        hex_string = hex_add_left_zero_padding(hex_string)
-        if not string_is_hex(hex_string):
+        tolerant = ("--tolerant" in argv)
+        # Line batch mode
+        input_path = get_option_value(argv, "-l")
+        if input_path is not None:
+            output_path = get_option_value(argv, "-o", "-")
+            num_workers = get_option_value(argv, "-j")
+            if num_workers is not None:
+                num_workers = int(num_workers)
+            f_in = stdin.buffer if input_path == "-" else open(input_path, "rb")
+            f_out = stdout.buffer if output_path == "-" else open(output_path, "wb")
+            try:
+                num_errors = hex_to_b64_batch(f_in, f_out, num_workers, tolerant)
+            finally:
+                if f_in is not stdin.buffer:
+                    f_in.close()
+                if f_out is not stdout.buffer:
+                    f_out.close()
+            finish(1 if num_errors else 0)
+        # Streaming mode
+        input_path = get_option_value(argv, "-f")
+        if input_path is not None:
+            output_path = get_option_value(argv, "-o", "-")
+            f_in = stdin.buffer if input_path == "-" else open(input_path, "rb")
+            f_out = stdout.buffer if output_path == "-" else open(output_path, "wb")
+            try:
+                hex_to_b64_stream(f_in, f_out, tolerant)
+            except ValueError as e:
+                stderr.write("Error: {}\n".format(e))
+                finish(1)
+            finally:
+                if f_in is not stdin.buffer:
+                    f_in.close()
+                if f_out is not stdout.buffer:
+                    f_out.close()
+            finish(0)
+        hex_string = [arg for arg in argv if arg != "--tolerant"][0]
+        hex_data, invalid_offset = hex_check(hex_string.encode("utf-8"), tolerant=tolerant)
+        if (invalid_offset >= 0) or (not hex_data):
             print("\nProvided string is not a valid hexadecimal data.")
             print("Provided string: {}".format(hex_string))
+            if invalid_offset >= 0:
+                invalid_offset = len(hex_string.encode("utf-8")[:invalid_offset].decode(
+                        "utf-8", "ignore"))
+                print("Invalid character \"{}\" at offset {}.".format(
+                        hex_string[invalid_offset], invalid_offset))
             print_script_usage()
             finish(1)
+        hex_string = hex_add_left_zero_padding(hex_data.decode("ascii"))
         hex_string = bytearray.fromhex(hex_string)
         b64_string = b64encode(hex_string)
         b64_string = b64_string.decode("utf-8")
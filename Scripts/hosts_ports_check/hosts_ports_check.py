@@ -5,10 +5,23 @@
 
 ### Libraries ###
 
-from os import path
+from os import path, cpu_count, remove, replace, getppid
 from sys import exit
-from time import sleep
-from signal import signal, SIGTERM, SIGINT
+from sys import argv as sys_argv
+from time import sleep, monotonic
+from signal import signal, SIGTERM, SIGINT, SIG_IGN, SIG_DFL
+from heapq import heappush, heappop
+from collections import deque
+from selectors import DefaultSelector, EVENT_WRITE
+from errno import ECONNREFUSED, EINPROGRESS, EAGAIN, EWOULDBLOCK, EADDRNOTAVAIL
+from resource import getrlimit, setrlimit, RLIMIT_NOFILE
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait as connections_wait
+from ipaddress import ip_network, ip_address
+from queue import Queue, Empty
+from json import dumps as json_dumps
+import asyncio
 
 from socket import *
 from threading import *
@@ -24,7 +37,14 @@ SCRIPT_PATH = path.dirname(path.realpath(__file__))
 F_HOSTS = SCRIPT_PATH + "/hosts.txt"
 F_HOSTS_OPEN = SCRIPT_PATH + "/results_hosts_open.txt"
 
-# Ports to check
+# Results files are flushed after this number of ports results, or this time (seconds)
+RESULTS_FLUSH_RECORDS = 1000
+RESULTS_FLUSH_INTERVAL = 1.0
+
+# Ports states written to the results output file if not provided
+DEFAULT_OUTPUT_STATES = "open"
+
+# Ports to check (all ports can be scanned with "-p all", see processes engine)
 #PORTS = list(range(65536))
 #PORTS = [22, 23, 80, 443, 1883, 1554]
 PORTS = [21, 22, 23, 24, 25, 26, 53, 80, 81, 110, 111, 113, 135, 139, 143, 179, 199, 443, 445, \
@@ -32,25 +52,93 @@ PORTS = [21, 22, 23, 24, 25, 26, 53, 80, 81, 110, 111, 113, 135, 139, 143, 179,
         1883, 2000, 2001, 3306, 3389, 5060, 5666, 5900, 6001, 8000, 8008, 8080, 8443, 8883, 8888, \
         10000, 11884, 32768, 49152, 49154]
 
-####################################################################################################
+# Connection timeout (seconds), maximum timeout if timeouts are adapted to hosts RTT
+DEFAULT_TIMEOUT = 1
 
-### Globals ###
+# Retries of connections timed out before the maximum timeout (adapted timeouts)
+DEFAULT_RETRIES = 1
 
-# List open ports
-l_open_ports = []
+# Adapted timeouts parameters (RFC 6298 retransmission timeout with a lower minimum timeout,
+# as scanned hosts are usually close)
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_K = 4
+RTT_CLOCK_GRANULARITY = 0.01
+RTT_MIN_TIMEOUT = 0.05
 
-####################################################################################################
+# Interval to check again the timeout of connections to hosts without RTT samples yet (seconds)
+RTT_CHECK_INTERVAL = 0.1
 
-### Functions ###
+# Scanner engines, and engine used if not provided
+ENGINES = ["threads", "asyncio", "selectors", "processes"]
+DEFAULT_ENGINE = "threads"
 
-def file_write_line(file_path, line):
-    '''Write a file line.'''
-    try:
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write("{}\n".format(line))
-    except Exception as e:
-        print("Error when opening file \"{}\". {}".format(file_path, str(e)))
+# Number of worker threads checking ports (threads engine)
+THREADS_MAX_WORKERS = 512
+
+# Ports checks queued per worker thread, so next hosts are queued while previous ones finish
+THREADS_QUEUED_PER_WORKER = 2
+
+# Maximum number of connections in progress at once (asyncio engine)
+ASYNC_MAX_CONCURRENCY = 500
+
+# Maximum number of connections in progress at once to the same host (asyncio engine)
+ASYNC_MAX_PER_HOST = 64
+
+# Maximum number of sockets in flight at once (selectors engine)
+SELECTORS_MAX_IN_FLIGHT = 20000
+
+# File descriptors kept free for other uses when sockets in flight are limited by fd limit
+RESERVED_FDS = 64
+
+# Maximum connection attempts (SYN packets) per second for all the workers, 0 for no limit
+DEFAULT_RATE = 0
+
+# Time of connection attempts that can be sent at once to catch up with the rate (seconds)
+RATE_BURST_TIME = 0.01
+
+# Ephemeral local ports range (used if it can't be read from the system)
+EPHEMERAL_PORTS_RANGE_FILE = "/proc/sys/net/ipv4/ip_local_port_range"
+EPHEMERAL_PORTS_RANGE = (32768, 60999)
+
+# Part of the ephemeral local ports that workers can use at once (processes engine)
+EPHEMERAL_PORTS_USAGE = 0.75
+
+# Results sent by workers to the main process at once, and maximum time between sends (seconds)
+WORKER_RESULTS_BATCH = 4096
+WORKER_RESULTS_INTERVAL = 0.5
+
+# Number of threads resolving hosts names at once
+RESOLVER_WORKERS = 32
+
+# Hosts names queued for resolution per resolver thread
+RESOLVER_QUEUED_PER_WORKER = 4
+
+# Maximum time to wait for a host name resolution (seconds), it is considered failed after it
+RESOLVE_TIMEOUT = 10
+
+# Time that resolved and failed (negative) hosts names are kept in cache (seconds)
+DNS_CACHE_TTL = 300
+DNS_NEGATIVE_TTL = 60
 
+# Maximum time to wait for pending hosts resolutions before checking connections (seconds)
+RESOLVER_POLL_INTERVAL = 0.05
+
+# Address families to resolve hosts names to (IPs in hosts list are used as they are)
+FAMILIES = {"4": AF_INET, "6": AF_INET6, "any": AF_UNSPEC}
+DEFAULT_FAMILY = "4"
+
+# Returned by a targets iterator when next targets are not available yet (selectors engine)
+TARGETS_PENDING = "pending"
+
+# Ports states
+PORT_OPEN = "open"
+PORT_CLOSED = "closed"
+PORT_FILTERED = "filtered"
+
+####################################################################################################
+
+### Functions ###
 
 def file_read_lines(file_path):
     '''Read file lines content and return them in a list.'''
@@ -70,57 +158,1019 @@ def file_read_lines(file_path):
     return l_lines
 
 
-def check_port(host, port):
-    global l_open_ports
-    try:
-        sock = socket(AF_INET, SOCK_STREAM)
-        sock.connect((host, port))
-        l_open_ports.append(port)
-    except:
-        pass
-    finally:
-        sock.close()
+def print_script_usage():
+    '''Function that shows script usage help.'''
+    print("Usage: python3 hosts_ports_check.py [-e ENGINE] [-t TIMEOUT] [-c MAX_CONNECTIONS]")
+    print("           [--per-host MAX_HOST_CONNECTIONS] [-p PORTS] [-j WORKERS] [--rate PPS]")
+    print("           [--family F] [--retries N] [--fixed-timeout] [-o FILE] [--states LIST]")
+    print("           [--state FILE]")
+    print("Engines:")
+    print("  threads    Pool of -c worker threads checking ports, next hosts queued while")
+    print("             previous ones finish (default).")
+    print("  asyncio    Asyncio connections to all hosts ports with global and per host limits.")
+    print("  selectors  Single thread non-blocking connects watched with epoll (-c sockets in")
+    print("             flight).")
+    print("  processes  Hosts and ports sharded between -j worker processes (default all cores)")
+    print("             running selectors engine, -c sockets in flight split between them.")
+    print("Options:")
+    print("  -p PORTS         Ports to check, \"all\" or a list of ports and ranges")
+    print("                   (i.e. 22,80,8000-8100).")
+    print("  -t TIMEOUT       Maximum connection timeout in seconds (default {}). Timeouts are"
+            .format(DEFAULT_TIMEOUT))
+    print("                   adapted to each host RTT, measured from its first responses.")
+    print("  --retries N      Retries of connections timed out before TIMEOUT (default {})."
+            .format(DEFAULT_RETRIES))
+    print("  --fixed-timeout  Always use TIMEOUT, without adapting it to hosts RTT.")
+    print("  --rate PPS       Maximum connection attempts per second (selectors and processes")
+    print("                   engines).")
+    print("  --family F       Address family hosts names are resolved to: 4, 6 or any")
+    print("                   (default 4).")
+    print("  -o FILE          Write ports results (host, ip, port, state, latency_ms) to FILE,")
+    print("                   as CSV (\".csv\" file) or JSON lines.")
+    print("  --states LIST    Ports states written to -o FILE: open, closed, filtered")
+    print("                   (default {}).".format(DEFAULT_OUTPUT_STATES))
+    print("  --state FILE     Journal of ports checked, an interrupted scan is resumed from it")
+    print("                   (it is removed when the scan finishes).")
+    print("Hosts file lines can be host names, IPs or networks (i.e. 192.168.1.0/24).")
+    print("")
 
 
-def scan_ports(host, ports):
-    global l_open_ports
-    try:
-        host_ip = gethostbyname(host)
-    except:
-        print("Cannot resolve {}: Unknown host".format(host))
-        return
-    #try:
-    #    host_name = gethostbyaddr(host_ip)
-    #    print("Hostname is {}".format(host_name[0]))
-    #except:
-    #    pass
-    l_threads = []
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-e asyncio"), or default if not
+    found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        finish(1)
+    return argv[i+1]
+
+
+def parse_ports(ports_spec):
+    '''Parse a ports argument ("all", or a comma separated list of ports and ranges "a-b").'''
+    if ports_spec == "all":
+        return list(range(1, 65536))
+    ports = []
+    for item in ports_spec.split(","):
+        if "-" in item:
+            first, last = item.split("-", 1)
+            ports.extend(range(int(first), int(last) + 1))
+        elif item != "":
+            ports.append(int(item))
     for port in ports:
-        t = Thread(target=check_port, args=(host_ip, int(port)))
-        t.start()
-        l_threads.append(t)
-    for t in l_threads:
-        t.join()
+        if (port < 0) or (port > 65535):
+            raise ValueError("Invalid port {}".format(port))
+    return ports
+
+
+def expand_hosts(l_hosts):
+    '''Expand the networks of a hosts list (i.e. "192.168.1.0/24") to its hosts IPs.'''
+    l_expanded = []
+    for host in l_hosts:
+        if "/" not in host:
+            l_expanded.append(host)
+            continue
+        try:
+            l_expanded.extend([str(ip) for ip in ip_network(host, strict=False).hosts()])
+        except ValueError as e:
+            print("Invalid network {}. {}".format(host, str(e)))
+    return l_expanded
+
+
+def show_scan_result(host, host_ip, l_open_ports):
+    '''Show the scan result of a host.'''
     if len(l_open_ports) == 0:
         print("All ports are closed in {}.".format(host_ip))
     else:
-        file_write_line(F_HOSTS_OPEN, host)
         print("Open ports in {} -".format(host_ip), end = '')
         for open_port in l_open_ports:
             print(" {}".format(open_port), end = '')
         print("")
-        l_open_ports.clear()
     print("")
 
+
+def journal_load(journal_path):
+    '''Load a scan journal, with lines "host,port,state" for each port checked and "host,*,done"
+    for each host finished. Return the set of hosts finished and a dictionary of the ports
+    checked of the other hosts as host: {port: state}.'''
+    hosts_done = set()
+    hosts_ports = {}
+    if not path.exists(journal_path):
+        return hosts_done, hosts_ports
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            # Last line can be incomplete if the process was killed while writing it
+            fields = line.rstrip("\n").split(",")
+            if (len(fields) != 3) or (not line.endswith("\n")):
+                continue
+            host, port, state = fields
+            if port == "*":
+                hosts_done.add(host)
+            else:
+                hosts_ports.setdefault(host, {})[int(port)] = state
+    for host in hosts_done:
+        hosts_ports.pop(host, None)
+    return hosts_done, hosts_ports
+
+
+def journal_save(journal_path, hosts_done, hosts_ports):
+    '''Save a compacted scan journal (written to a temporary file and then renamed).'''
+    tmp_path = "{}.tmp".format(journal_path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for host in hosts_done:
+            f.write("{},*,done\n".format(host))
+        for host, ports_states in hosts_ports.items():
+            for port, state in ports_states.items():
+                f.write("{},{},{}\n".format(host, port, state))
+    replace(tmp_path, journal_path)
+
+
+def ip_family(host_ip):
+    '''Get the address family of an IP.'''
+    if ":" in host_ip:
+        return AF_INET6
+    return AF_INET
+
+
+def check_port(host_ip, port, timeout=DEFAULT_TIMEOUT):
+    '''Threads engine: check a host port. Return the port state.'''
+    sock = socket(ip_family(host_ip), SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect((host_ip, port))
+        return PORT_OPEN
+    except ConnectionRefusedError:
+        return PORT_CLOSED
+    except Exception:
+        return PORT_FILTERED
+    finally:
+        sock.close()
+
+
+def check_port_task(scan_results, host_scan, port, retries, sem_queued):
+    '''Threads engine: worker task that checks a port of a host and saves its result.
+    Connections that time out before the maximum timeout are retried up to retries times.'''
+    try:
+        attempt = 0
+        while True:
+            timeout = host_scan.rtt.timeout(attempt)
+            start_time = monotonic()
+            state = check_port(host_scan.host_ip, port, timeout)
+            rtt_sample = monotonic() - start_time
+            if (state != PORT_FILTERED) or (attempt >= retries) or \
+                    (timeout >= host_scan.rtt.max_timeout):
+                break
+            attempt += 1
+        if state == PORT_FILTERED:
+            rtt_sample = None
+        else:
+            host_scan.rtt_sample(rtt_sample)
+        scan_results.port_checked(host_scan.host_index, port, state, rtt_sample)
+    finally:
+        sem_queued.release()
+
+
+def scan_ports(executor, scan_results, host_index, host, host_ip, ports, timeout, retries,
+        adaptive, sem_queued):
+    '''Threads engine: queue the ports checks of a host in the workers pool. It blocks while
+    the pool queue is full, and returns once all the ports are queued.'''
+    #try:
+    #    host_name = gethostbyaddr(host_ip)
+    #    print("Hostname is {}".format(host_name[0]))
+    #except:
+    #    pass
+    host_scan = HostScan(host_index, host_ip, RttEstimator(timeout, adaptive))
+    for port in scan_results.host_ports(host_index, host, host_ip, ports):
+        sem_queued.acquire()
+        executor.submit(check_port_task, scan_results, host_scan, port, retries, sem_queued)
+
+
+def threads_scan_hosts(l_hosts, ports, scan_results, timeout=DEFAULT_TIMEOUT,
+        max_workers=THREADS_MAX_WORKERS, resolver=None, retries=DEFAULT_RETRIES, adaptive=True):
+    '''Threads engine: scan the ports of a list of hosts with a pool of worker threads. Hosts
+    are pipelined, ports of next hosts are queued while the last ports of previous hosts are
+    still being checked, and each host result is shown when all its ports are checked.
+    Ports checked after the host first responses use a timeout adapted to its RTT.'''
+    ports = [int(port) for port in ports]
+    if len(ports) == 0:
+        return
+    if resolver is None:
+        resolver = Resolver()
+    sem_queued = Semaphore(max_workers * THREADS_QUEUED_PER_WORKER)
+    with ThreadPoolExecutor(max_workers) as executor:
+        for host_index, host, host_ip in resolver.resolve_stream(l_hosts):
+            if host_ip is None:
+                scan_results.show_message("Cannot resolve {}: Unknown host".format(host))
+                continue
+            scan_ports(executor, scan_results, host_index, host, host_ip, ports, timeout,
+                    retries, adaptive, sem_queued)
+
+
+async def async_check_port(host_ip, port, rtt, retries, sem_global):
+    '''Asyncio engine: check if a host port is open, with the host RTT estimator timeout (that
+    is checked again while connecting, as RTT samples arrive). Connections that time out
+    before the maximum timeout are retried up to retries times. Return the port state and the
+    connection latency (None if the host didn't respond).'''
+    async with sem_global:
+        attempt = 0
+        while True:
+            start_time = monotonic()
+            connect = asyncio.ensure_future(asyncio.open_connection(host_ip, port))
+            timed_out = False
+            while not connect.done():
+                now = monotonic()
+                if start_time + rtt.timeout(attempt) <= now:
+                    connect.cancel()
+                    timed_out = True
+                    break
+                await asyncio.wait({connect}, timeout=rtt.check_time(start_time, attempt, now)
+                        - now)
+            if not timed_out:
+                break
+            if (attempt >= retries) or (rtt.timeout(attempt) >= rtt.max_timeout):
+                return (PORT_FILTERED, None)
+            attempt += 1
+        try:
+            _, writer = connect.result()
+            latency = monotonic() - start_time
+            rtt.sample(latency)
+        except ConnectionRefusedError:
+            latency = monotonic() - start_time
+            rtt.sample(latency)
+            return (PORT_CLOSED, latency)
+        except Exception:
+            return (PORT_FILTERED, None)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return (PORT_OPEN, latency)
+
+
+async def async_scan_host(scan_results, host_index, host, host_ip, ports, timeout, sem_global,
+        max_per_host, retries, adaptive):
+    '''Asyncio engine: check the ports of a host with up to max_per_host worker coroutines,
+    that take the ports from a shared iterator (so there is no task per port, and a worker
+    only waits for a global slot, after it got its host slot).'''
+    rtt = RttEstimator(timeout, adaptive)
+    host_ports = scan_results.host_ports(host_index, host, host_ip, ports)
+    ports_iter = iter(host_ports)
+    async def check_ports_worker():
+        for port in ports_iter:
+            state, latency = await async_check_port(host_ip, port, rtt, retries, sem_global)
+            scan_results.port_checked(host_index, port, state, latency)
+    await asyncio.gather(*[check_ports_worker()
+            for _ in range(min(max_per_host, len(host_ports)))])
+
+
+async def async_scan_hosts(l_hosts, ports, scan_results, timeout=DEFAULT_TIMEOUT,
+        max_concurrency=ASYNC_MAX_CONCURRENCY, max_per_host=ASYNC_MAX_PER_HOST, resolver=None,
+        retries=DEFAULT_RETRIES, adaptive=True):
+    '''Asyncio engine: scan all the (host, port) pairs with a global limit of connections in
+    progress and a limit per host. Hosts are started as they are resolved (by the resolver
+    threads) and results are shown as soon as each host scan finishes.'''
+    ports = [int(port) for port in ports]
+    if resolver is None:
+        resolver = Resolver()
+    loop = asyncio.get_running_loop()
+    sem_global = asyncio.Semaphore(max_concurrency)
+    # Bound the number of hosts in flight, so pending tasks don't grow with hosts list size
+    ports_per_host = max(min(len(ports), max_per_host), 1)
+    sem_hosts = asyncio.Semaphore(2 * max(max_concurrency // ports_per_host, 1))
+    # Resolved hosts are passed from a resolver thread to the event loop (None when finished)
+    resolved = asyncio.Queue()
+    def resolve_hosts():
+        for resolution in resolver.resolve_stream(l_hosts):
+            loop.call_soon_threadsafe(resolved.put_nowait, resolution)
+        loop.call_soon_threadsafe(resolved.put_nowait, None)
+    Thread(target=resolve_hosts, daemon=True).start()
+    async def scan_host_bounded(host_index, host, host_ip):
+        try:
+            await async_scan_host(scan_results, host_index, host, host_ip, ports, timeout,
+                    sem_global, max_per_host, retries, adaptive)
+        finally:
+            sem_hosts.release()
+    tasks = set()
+    while True:
+        resolution = await resolved.get()
+        if resolution is None:
+            break
+        host_index, host, host_ip = resolution
+        if host_ip is None:
+            scan_results.show_message("Cannot resolve {}: Unknown host".format(host))
+            continue
+        await sem_hosts.acquire()
+        task = asyncio.create_task(scan_host_bounded(host_index, host, host_ip))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+
+def get_max_sockets(max_sockets):
+    '''Get the maximum number of sockets that can be opened at once (up to max_sockets), raising
+    the process file descriptors soft limit to the hard limit if needed.'''
+    soft, hard = getrlimit(RLIMIT_NOFILE)
+    if soft < max_sockets + RESERVED_FDS:
+        try:
+            new_soft = max_sockets + RESERVED_FDS
+            if hard >= 0:
+                new_soft = min(new_soft, hard)
+            setrlimit(RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except Exception:
+            pass
+    return max(min(max_sockets, soft - RESERVED_FDS), 1)
+
+
+def connect_error_state(error):
+    '''Get the port state from a connection error code.'''
+    if error == 0:
+        return PORT_OPEN
+    if error == ECONNREFUSED:
+        return PORT_CLOSED
+    return PORT_FILTERED
+
+
+def selectors_scan(targets, timeout=DEFAULT_TIMEOUT, max_in_flight=SELECTORS_MAX_IN_FLIGHT,
+        rate=DEFAULT_RATE, retries=DEFAULT_RETRIES, adaptive=True):
+    '''Selectors engine: single thread non-blocking connect scanner. Targets is an iterable of
+    (tag, (host_ip, port)) that is consumed lazily, keeping up to max_in_flight sockets in
+    flight watched for write-readiness (epoll on Linux), and expired from a timer heap.
+    If rate is provided, no more than rate connections are started per second. Targets can
+    return TARGETS_PENDING when next targets are not available yet (i.e. hosts being resolved).
+    If adaptive, connections timeout is adapted to each host RTT (up to timeout), and
+    connections that time out before timeout are retried up to retries times.
+    Yield (tag, (host_ip, port), state, latency) results as connections finish (latency is the
+    connection time, or None if the host didn't respond).'''
+    targets = iter(targets)
+    # Targets to start again as (target, attempt)
+    pending_retries = deque()
+    selector = DefaultSelector()
+    # Hosts RTT estimators, by host IP
+    rtts = {}
+    # Sockets in flight: id: (socket, target, start time, attempt), and timers heap of
+    # (check time, id)
+    in_flight = {}
+    timers = []
+    next_id = 0
+    targets_done = False
+    targets_pending = False
+    # Time when next connection can be started (rate limit)
+    send_interval = (1.0 / rate) if rate else 0
+    next_send = monotonic()
+    try:
+        while True:
+            # Start new connections
+            targets_pending = False
+            while len(in_flight) < max_in_flight:
+                if send_interval:
+                    now = monotonic()
+                    if now < next_send:
+                        break
+                    next_send = max(next_send, now - RATE_BURST_TIME) + send_interval
+                if pending_retries:
+                    target, attempt = pending_retries.popleft()
+                else:
+                    target = next(targets, None)
+                    attempt = 0
+                    if target is None:
+                        targets_done = True
+                        break
+                    if target is TARGETS_PENDING:
+                        targets_pending = True
+                        break
+                host_ip = target[1][0]
+                if host_ip not in rtts:
+                    rtts[host_ip] = RttEstimator(timeout, adaptive)
+                sock = socket(ip_family(host_ip), SOCK_STREAM)
+                sock.setblocking(False)
+                start_time = monotonic()
+                error = sock.connect_ex(target[1])
+                if error in (EINPROGRESS, EAGAIN, EWOULDBLOCK):
+                    next_id += 1
+                    in_flight[next_id] = (sock, target, start_time, attempt)
+                    selector.register(sock, EVENT_WRITE, next_id)
+                    heappush(timers, (rtts[host_ip].check_time(start_time, attempt, start_time),
+                            next_id))
+                    continue
+                sock.close()
+                # No local ports available, retry when some connections finish
+                if (error == EADDRNOTAVAIL) and in_flight:
+                    pending_retries.append((target, attempt))
+                    break
+                state = connect_error_state(error)
+                latency = (monotonic() - start_time) if state != PORT_FILTERED else None
+                yield (target[0], target[1], state, latency)
+            if (not in_flight) and targets_done and (not pending_retries):
+                break
+            # Wait for connections to finish (or the next timer to expire, the next connection
+            # allowed by rate limit, or polling pending targets)
+            now = monotonic()
+            l_wait_times = [timers[0][0] - now] if timers else []
+            if send_interval and ((not targets_done) or pending_retries) and \
+                    (len(in_flight) < max_in_flight):
+                l_wait_times.append(next_send - now)
+            if targets_pending:
+                l_wait_times.append(RESOLVER_POLL_INTERVAL)
+            wait_time = max(min(l_wait_times), 0) if l_wait_times else 0
+            for key, _ in selector.select(wait_time):
+                sock, target, start_time, _ = in_flight.pop(key.data)
+                selector.unregister(sock)
+                error = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                sock.close()
+                state = connect_error_state(error)
+                # Host responses (SYN-ACK or RST) are RTT samples
+                latency = None
+                if state != PORT_FILTERED:
+                    latency = monotonic() - start_time
+                    rtts[target[1][0]].sample(latency)
+                yield (target[0], target[1], state, latency)
+            # Expire timed out connections (timers of finished connections are discarded).
+            # Timeout is checked against host current RTT estimation, so connections started
+            # before the host first responses are expired with the adapted timeout too
+            now = monotonic()
+            while timers and (timers[0][0] <= now):
+                _, sock_id = heappop(timers)
+                if sock_id not in in_flight:
+                    continue
+                sock, target, start_time, attempt = in_flight[sock_id]
+                rtt = rtts[target[1][0]]
+                if start_time + rtt.timeout(attempt) > now:
+                    heappush(timers, (rtt.check_time(start_time, attempt, now), sock_id))
+                    continue
+                del in_flight[sock_id]
+                selector.unregister(sock)
+                sock.close()
+                # Timeouts shorter than the maximum timeout are ambiguous, retry them
+                if (attempt < retries) and (rtt.timeout(attempt) < timeout):
+                    pending_retries.append((target, attempt + 1))
+                    continue
+                yield (target[0], target[1], PORT_FILTERED, None)
+    finally:
+        for sock, _, _, _ in in_flight.values():
+            sock.close()
+        selector.close()
+
+
+def selectors_scan_hosts(l_hosts, ports, scan_results, timeout=DEFAULT_TIMEOUT,
+        max_in_flight=SELECTORS_MAX_IN_FLIGHT, rate=DEFAULT_RATE, resolver=None,
+        retries=DEFAULT_RETRIES, adaptive=True):
+    '''Selectors engine: scan the ports of a list of hosts, showing the result of each host
+    when all its ports are checked. Hosts are resolved concurrently while scanning, without
+    blocking the connections in flight.'''
+    ports = [int(port) for port in ports]
+    if len(ports) == 0:
+        return
+    if resolver is None:
+        resolver = Resolver()
+    max_in_flight = get_max_sockets(max_in_flight)
+    def targets():
+        for resolution in resolver.resolve_stream(l_hosts, block=False):
+            if resolution is TARGETS_PENDING:
+                yield TARGETS_PENDING
+                continue
+            host_index, host, host_ip = resolution
+            if host_ip is None:
+                scan_results.show_message("Cannot resolve {}: Unknown host".format(host))
+                continue
+            for port in scan_results.host_ports(host_index, host, host_ip, ports):
+                yield (host_index, (host_ip, port))
+    for host_index, (_, port), state, latency in selectors_scan(targets(), timeout,
+            max_in_flight, rate, retries, adaptive):
+        scan_results.port_checked(host_index, port, state, latency)
+
+
+def get_ephemeral_ports_count():
+    '''Get the number of local ephemeral ports available for outgoing connections.'''
+    first, last = EPHEMERAL_PORTS_RANGE
+    try:
+        with open(EPHEMERAL_PORTS_RANGE_FILE, "r") as f:
+            first, last = [int(value) for value in f.read().split()]
+    except Exception:
+        pass
+    return max(last - first + 1, 1)
+
+
+def shard_worker(worker_index, num_workers, l_targets, timeout, max_in_flight, rate, retries,
+        adaptive, conn):
+    '''Processes engine worker: scan its shard of the (host, port) space, l_targets being a
+    list of (host index, host IP, ports), with the selectors engine and send the results to the
+    main process through conn in batches of ("results", [(host index, port, state, latency)]),
+    ending with ("done", None). Shard is every num_workers-th (host, port) pair, so all workers
+    share the load of each host.'''
+    # Ctrl+C is handled by main process, that terminates the workers
+    signal(SIGINT, SIG_IGN)
+    signal(SIGTERM, SIG_DFL)
+    def targets():
+        # Index of the first (host, port) pair of each host in the (host, port) space
+        first = 0
+        for host_index, host_ip, ports in l_targets:
+            for port in ports[(worker_index - first) % num_workers::num_workers]:
+                yield (host_index, (host_ip, port))
+            first += len(ports)
+    max_in_flight = get_max_sockets(max_in_flight)
+    l_results = []
+    last_send = monotonic()
+    main_pid = getppid()
+    for host_index, (_, port), state, latency in selectors_scan(targets(), timeout,
+            max_in_flight, rate, retries, adaptive):
+        l_results.append((host_index, port, state, latency))
+        if (len(l_results) >= WORKER_RESULTS_BATCH) or \
+                (monotonic() - last_send >= WORKER_RESULTS_INTERVAL):
+            # Finish if main process is gone (i.e. killed, as workers pipes are inherited by
+            # next workers, sending doesn't fail)
+            if getppid() != main_pid:
+                return
+            conn.send(("results", l_results))
+            l_results = []
+            last_send = monotonic()
+    conn.send(("results", l_results))
+    conn.send(("done", None))
+    conn.close()
+
+
+def processes_scan_hosts(l_hosts, ports, scan_results, timeout=DEFAULT_TIMEOUT,
+        max_in_flight=SELECTORS_MAX_IN_FLIGHT, rate=DEFAULT_RATE, num_workers=0, resolver=None,
+        retries=DEFAULT_RETRIES, adaptive=True):
+    '''Processes engine: resolve the hosts and shard the (host, port) space between worker
+    processes running the selectors engine. Sockets in flight and rate limit are split fairly
+    between workers, and the sockets in flight are bounded by the local ephemeral ports, so
+    workers don't run out of local ports. Results are merged from workers pipes, showing the
+    result of each host when all its ports are checked.'''
+    ports = [int(port) for port in ports]
+    if len(ports) == 0:
+        return
+    if resolver is None:
+        resolver = Resolver()
+    # Hosts are resolved concurrently, and kept in hosts list order
+    l_targets = []
+    num_targets = 0
+    for host_index, host, host_ip in sorted(resolver.resolve_stream(l_hosts)):
+        if host_ip is None:
+            scan_results.show_message("Cannot resolve {}: Unknown host".format(host))
+            continue
+        host_ports = scan_results.host_ports(host_index, host, host_ip, ports)
+        if len(host_ports) > 0:
+            l_targets.append((host_index, host_ip, host_ports))
+            num_targets += len(host_ports)
+    if num_targets == 0:
+        return
+    if num_workers <= 0:
+        num_workers = cpu_count() or 1
+    num_workers = min(num_workers, num_targets)
+    max_in_flight = min(max_in_flight, int(get_ephemeral_ports_count() * EPHEMERAL_PORTS_USAGE))
+    worker_max_in_flight = max(max_in_flight // num_workers, 1)
+    worker_rate = (rate / num_workers) if rate else 0
+    l_workers = []
+    l_conns = []
+    try:
+        for worker_index in range(num_workers):
+            conn_recv, conn_send = Pipe(duplex=False)
+            worker = Process(target=shard_worker, args=(worker_index, num_workers, l_targets,
+                    timeout, worker_max_in_flight, worker_rate, retries, adaptive, conn_send),
+                    daemon=True)
+            worker.start()
+            conn_send.close()
+            l_workers.append(worker)
+            l_conns.append(conn_recv)
+        while l_conns:
+            for conn in connections_wait(l_conns):
+                try:
+                    kind, l_results = conn.recv()
+                except EOFError:
+                    kind = "done"
+                if kind == "done":
+                    l_conns.remove(conn)
+                    conn.close()
+                    continue
+                for host_index, port, state, latency in l_results:
+                    scan_results.port_checked(host_index, port, state, latency)
+        for worker in l_workers:
+            worker.join()
+    finally:
+        for worker in l_workers:
+            if worker.is_alive():
+                worker.terminate()
+
+
+def scan_hosts(l_hosts, ports, engine=DEFAULT_ENGINE, timeout=DEFAULT_TIMEOUT, options=None):
+    '''Scan the ports of a list of hosts with the selected engine. Results are written to the
+    results files (and the scan journal if provided, that is removed once the scan finishes).'''
+    if options is None:
+        options = {}
+    if engine not in ENGINES:
+        print("Unknown scanner engine \"{}\".".format(engine))
+        print_script_usage()
+        finish(1)
+    resolver = Resolver(FAMILIES[options.get("family") or DEFAULT_FAMILY])
+    retries = options.get("retries", DEFAULT_RETRIES)
+    adaptive = options.get("adaptive", True)
+    scan_results = ScanResults(options.get("output_path"),
+            options.get("output_states") or (PORT_OPEN,), options.get("journal_path"),
+            options.get("hosts_open_path") or F_HOSTS_OPEN)
+    completed = False
+    try:
+        if engine == "threads":
+            threads_scan_hosts(l_hosts, ports, scan_results, timeout,
+                    options.get("max_concurrency") or THREADS_MAX_WORKERS, resolver, retries,
+                    adaptive)
+        elif engine == "asyncio":
+            asyncio.run(async_scan_hosts(l_hosts, ports, scan_results, timeout,
+                    options.get("max_concurrency") or ASYNC_MAX_CONCURRENCY,
+                    options.get("max_per_host") or ASYNC_MAX_PER_HOST, resolver, retries,
+                    adaptive))
+        elif engine == "selectors":
+            selectors_scan_hosts(l_hosts, ports, scan_results, timeout,
+                    options.get("max_concurrency") or SELECTORS_MAX_IN_FLIGHT,
+                    options.get("rate") or DEFAULT_RATE, resolver, retries, adaptive)
+        elif engine == "processes":
+            processes_scan_hosts(l_hosts, ports, scan_results, timeout,
+                    options.get("max_concurrency") or SELECTORS_MAX_IN_FLIGHT,
+                    options.get("rate") or DEFAULT_RATE, options.get("num_workers") or 0,
+                    resolver, retries, adaptive)
+        completed = True
+    finally:
+        scan_results.close(completed)
+
+####################################################################################################
+
+### Classes ###
+
+class BufferedWriter(object):
+    '''Lines writer that appends the lines to a file only when flushed.'''
+
+    def __init__(self, file_path, header=None):
+        '''Class Constructor'''
+        self.f = open(file_path, "a", encoding="utf-8")
+        self.lines = []
+        if (header is not None) and (self.f.tell() == 0):
+            self.lines.append(header)
+
+
+    def write_line(self, line):
+        '''Add a line to the buffer.'''
+        self.lines.append(line)
+
+
+    def flush(self):
+        '''Write the buffered lines to the file.'''
+        if self.lines:
+            self.lines.append("")
+            self.f.write("\n".join(self.lines))
+            self.f.flush()
+            self.lines = []
+
+
+    def close(self):
+        '''Flush the buffered lines and close the file.'''
+        self.flush()
+        self.f.close()
+
+
+class ScanResults(object):
+    '''Results of the hosts scan, shared by all the engines: ports pending and open ports of
+    each host in progress (host result is shown when all its ports are checked), and buffered
+    writers of hosts with open ports, ports results (CSV or JSON lines) and the journal of ports
+    checked, that is used to resume an interrupted scan. Files are flushed periodically, results
+    before journal, so a port in journal always has its results written.'''
+
+    def __init__(self, output_path=None, output_states=(PORT_OPEN,), journal_path=None,
+            hosts_open_path=F_HOSTS_OPEN):
+        '''Class Constructor'''
+        # Host index: [host, host IP, number of ports pending, open ports]
+        self.hosts = {}
+        self.lock = Lock()
+        self.hosts_open = BufferedWriter(hosts_open_path)
+        self.output = None
+        self.output_csv = (output_path is not None) and output_path.lower().endswith(".csv")
+        self.output_states = output_states
+        if output_path is not None:
+            self.output = BufferedWriter(output_path,
+                    "host,ip,port,state,latency_ms" if self.output_csv else None)
+        self.journal = None
+        self.journal_path = journal_path
+        self.journal_done = set()
+        self.journal_ports = {}
+        if journal_path is not None:
+            self.journal_done, self.journal_ports = journal_load(journal_path)
+            if self.journal_done or self.journal_ports:
+                print("Resuming scan from {} ({} hosts done, {} in progress).".format(
+                        journal_path, len(self.journal_done), len(self.journal_ports)))
+                print("")
+            journal_save(journal_path, self.journal_done, self.journal_ports)
+            self.journal = BufferedWriter(journal_path)
+        self.num_pending_flush = 0
+        self.last_flush = monotonic()
+
+
+    def show_message(self, message):
+        '''Show a message (without mixing it with hosts results shown by other threads).'''
+        with self.lock:
+            print(message)
+
+
+    def host_ports(self, host_index, host, host_ip, ports):
+        '''Add a host to scan. Return its ports pending (not checked yet in journal).'''
+        with self.lock:
+            if host in self.journal_done:
+                print("Host {} already scanned.".format(host))
+                print("")
+                return []
+            ports_states = self.journal_ports.pop(host, {})
+            l_pending = [port for port in ports if port not in ports_states]
+            l_open_ports = [port for port, state in ports_states.items() if state == PORT_OPEN]
+            if len(l_pending) == 0:
+                self.host_done(host, host_ip, l_open_ports)
+                return []
+            self.hosts[host_index] = [host, host_ip, len(l_pending), l_open_ports]
+            return l_pending
+
+
+    def port_checked(self, host_index, port, state, latency=None):
+        '''Save a port check result and its connection latency (seconds, None if the host didn't
+        respond). Show the host result if it was its last port pending.'''
+        with self.lock:
+            host_info = self.hosts[host_index]
+            if (self.output is not None) and (state in self.output_states):
+                latency_ms = round(latency * 1000, 3) if latency is not None else None
+                if self.output_csv:
+                    self.output.write_line("{},{},{},{},{}".format(host_info[0], host_info[1],
+                            port, state, "" if latency_ms is None else latency_ms))
+                else:
+                    self.output.write_line(json_dumps({"host": host_info[0], "ip": host_info[1],
+                            "port": port, "state": state, "latency_ms": latency_ms}))
+            if self.journal is not None:
+                self.journal.write_line("{},{},{}".format(host_info[0], port, state))
+            if state == PORT_OPEN:
+                host_info[3].append(port)
+            host_info[2] -= 1
+            if host_info[2] == 0:
+                del self.hosts[host_index]
+                self.host_done(host_info[0], host_info[1], host_info[3])
+            self.num_pending_flush += 1
+            if (self.num_pending_flush >= RESULTS_FLUSH_RECORDS) or \
+                    (monotonic() - self.last_flush >= RESULTS_FLUSH_INTERVAL):
+                self.flush()
+
+
+    def host_done(self, host, host_ip, l_open_ports):
+        '''Show and save the result of a host with all its ports checked.'''
+        show_scan_result(host, host_ip, sorted(l_open_ports))
+        if len(l_open_ports) > 0:
+            self.hosts_open.write_line(host)
+        if self.journal is not None:
+            self.journal.write_line("{},*,done".format(host))
+
+
+    def flush(self):
+        '''Write the buffered results to files (journal the last).'''
+        if self.output is not None:
+            self.output.flush()
+        self.hosts_open.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        self.num_pending_flush = 0
+        self.last_flush = monotonic()
+
+
+    def close(self, completed=False):
+        '''Flush and close the results files. Journal is removed if the scan is completed, so
+        next scan starts from scratch.'''
+        with self.lock:
+            self.flush()
+            if self.output is not None:
+                self.output.close()
+            self.hosts_open.close()
+            if self.journal is not None:
+                self.journal.close()
+                if completed:
+                    remove(self.journal_path)
+
+
+class Resolver(object):
+    '''Hosts names resolver, with a pool of threads resolving names concurrently and a cache of
+    resolved and failed names.'''
+
+    def __init__(self, family=AF_INET, num_workers=RESOLVER_WORKERS, timeout=RESOLVE_TIMEOUT,
+            ttl=DNS_CACHE_TTL, negative_ttl=DNS_NEGATIVE_TTL):
+        '''Class Constructor'''
+        self.family = family
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Host name: (expiration time, IP or None if resolution failed)
+        self.cache = {}
+        self.lock = Lock()
+
+
+    def cache_get(self, host):
+        '''Get a host from cache as (found, IP or None if resolution failed).'''
+        with self.lock:
+            entry = self.cache.get(host)
+            if entry is None:
+                return (False, None)
+            if entry[0] <= monotonic():
+                del self.cache[host]
+                return (False, None)
+            return (True, entry[1])
+
+
+    def cache_put(self, host, host_ip):
+        '''Save a host resolution result in cache.'''
+        ttl = self.ttl if host_ip is not None else self.negative_ttl
+        with self.lock:
+            self.cache[host] = (monotonic() + ttl, host_ip)
+
+
+    def resolve(self, host):
+        '''Resolve a host name (blocking). Return its IP, or None if it can't be resolved.'''
+        try:
+            return str(ip_address(host))
+        except ValueError:
+            pass
+        found, host_ip = self.cache_get(host)
+        if found:
+            return host_ip
+        try:
+            addr_info = getaddrinfo(host, None, self.family, SOCK_STREAM)
+            host_ip = addr_info[0][4][0]
+        except Exception:
+            host_ip = None
+        self.cache_put(host, host_ip)
+        return host_ip
+
+
+    def resolve_worker(self, requests, results):
+        '''Resolver thread: resolve the hosts of requests queue until a None request, putting a
+        ("started", host index, start time) message when each resolution starts and a
+        ("resolved", host index, host, IP or None) message when it finishes.'''
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            host_index, host = request
+            results.put(("started", host_index, monotonic()))
+            results.put(("resolved", host_index, host, self.resolve(host)))
+
+
+    def resolve_stream(self, l_hosts, block=True):
+        '''Resolve a list of hosts concurrently. Yield (host index, host, IP or None if it can't
+        be resolved) as resolutions finish, so slow names don't hold the next ones. Names not
+        resolved in timeout seconds since their resolution started are considered failed, and
+        their resolver thread is replaced, so hung names don't hold the names queued after them.
+        If block is False, TARGETS_PENDING is yielded instead of waiting for pending
+        resolutions.'''
+        requests = Queue()
+        results = Queue()
+        # Resolver threads are daemon, so a hung resolution doesn't hold the process exit
+        num_threads = 0
+        for _ in range(self.num_workers):
+            Thread(target=self.resolve_worker, args=(requests, results), daemon=True).start()
+            num_threads += 1
+        # Host index: [host, deadline or None if its resolution has not started yet]
+        in_flight = {}
+        max_in_flight = self.num_workers * RESOLVER_QUEUED_PER_WORKER
+        hosts = iter(l_hosts)
+        host_index = 0
+        hosts_done = False
+        try:
+            while True:
+                # Queue next hosts
+                while (not hosts_done) and (len(in_flight) < max_in_flight):
+                    host = next(hosts, None)
+                    if host is None:
+                        hosts_done = True
+                        break
+                    # IPs and cached names are returned at once
+                    found, host_ip = self.cache_get(host)
+                    if not found:
+                        try:
+                            host_ip = str(ip_address(host))
+                            found = True
+                        except ValueError:
+                            pass
+                    if found:
+                        yield (host_index, host, host_ip)
+                    else:
+                        in_flight[host_index] = [host, None]
+                        requests.put((host_index, host))
+                    host_index += 1
+                if (not in_flight) and hosts_done:
+                    break
+                # Wait for next message, up to the first deadline of the resolutions started
+                wait_time = None
+                l_deadlines = [deadline for _, deadline in in_flight.values()
+                        if deadline is not None]
+                if l_deadlines:
+                    wait_time = max(min(l_deadlines) - monotonic(), 0)
+                if not block:
+                    wait_time = 0
+                try:
+                    message = results.get(timeout=wait_time)
+                except Empty:
+                    message = None
+                if message is not None:
+                    if message[0] == "started":
+                        _, index, start_time = message
+                        if index in in_flight:
+                            in_flight[index][1] = start_time + self.timeout
+                    else:
+                        _, index, host, host_ip = message
+                        # Discard results of resolutions that already timed out
+                        if in_flight.pop(index, None) is not None:
+                            yield (index, host, host_ip)
+                        continue
+                now = monotonic()
+                for index, (host, deadline) in list(in_flight.items()):
+                    if (deadline is None) or (deadline > now):
+                        continue
+                    del in_flight[index]
+                    self.cache_put(host, None)
+                    # Its thread is hung in the resolution, start another one
+                    Thread(target=self.resolve_worker, args=(requests, results),
+                            daemon=True).start()
+                    num_threads += 1
+                    yield (index, host, None)
+                if (not block) and (message is None):
+                    yield TARGETS_PENDING
+        finally:
+            for _ in range(num_threads):
+                requests.put(None)
+
+
+class RttEstimator(object):
+    '''Connection round trip time estimator of a host, that gets the connections timeout from a
+    smoothed RTT and its variance (TCP retransmission timeout style, RFC 6298). The timeout is
+    max_timeout until the first RTT sample, or always if not adaptive.'''
+
+    def __init__(self, max_timeout=DEFAULT_TIMEOUT, adaptive=True):
+        '''Class Constructor'''
+        self.max_timeout = max_timeout
+        self.adaptive = adaptive
+        self.srtt = None
+        self.rttvar = None
+        self.rto = max_timeout
+
+
+    def sample(self, rtt):
+        '''Update the estimation with a connection RTT (seconds).'''
+        if not self.adaptive:
+            return
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        rto = self.srtt + max(RTT_CLOCK_GRANULARITY, RTT_K * self.rttvar)
+        self.rto = min(max(rto, RTT_MIN_TIMEOUT), self.max_timeout)
+
+
+    def timeout(self, attempt=0):
+        '''Get the connections timeout, doubled for each retry attempt.'''
+        return min(self.rto * (2 ** attempt), self.max_timeout)
+
+
+    def check_time(self, start_time, attempt, now):
+        '''Get the time to check if a connection started at start_time has timed out. Without
+        RTT samples it is checked periodically, to apply the timeout once samples arrive.'''
+        check_time = start_time + self.timeout(attempt)
+        if self.adaptive and (self.srtt is None):
+            check_time = min(check_time, now + RTT_CHECK_INTERVAL)
+        return check_time
+
+
+class HostScan(object):
+    '''Scan state of a host, shared by the worker threads checking its ports.'''
+
+    def __init__(self, host_index, host_ip, rtt):
+        '''Class Constructor'''
+        self.host_index = host_index
+        self.host_ip = host_ip
+        self.rtt = rtt
+        self.lock = Lock()
+
+
+    def rtt_sample(self, rtt_sample):
+        '''Update the host RTT estimation with a connection RTT.'''
+        with self.lock:
+            self.rtt.sample(rtt_sample)
+
 ####################################################################################################
 
 ### Main and Finish Functions ###
 
 def main():
     '''Main Function.'''
+    if ("-h" in sys_argv[1:]) or ("--help" in sys_argv[1:]):
+        print_script_usage()
+        finish(0)
     print("")
     print("Reading list of hosts from {}...".format(F_HOSTS))
-    l_hosts = file_read_lines(F_HOSTS)
+    l_hosts = expand_hosts(file_read_lines(F_HOSTS))
     if len(l_hosts) == 0:
         print("No hosts in {}, exiting.".format(F_HOSTS))
         finish(1)
@@ -130,9 +1180,38 @@ def main():
     for host in l_hosts:
         print(host)
     print("")
-    setdefaulttimeout(1)
-    for host in l_hosts:
-        scan_ports(host, PORTS)
+    argv = sys_argv[1:]
+    engine = get_option_value(argv, "-e", DEFAULT_ENGINE)
+    timeout = float(get_option_value(argv, "-t", DEFAULT_TIMEOUT))
+    options = {}
+    options["max_concurrency"] = int(get_option_value(argv, "-c", 0))
+    options["max_per_host"] = int(get_option_value(argv, "--per-host", 0))
+    options["num_workers"] = int(get_option_value(argv, "-j", 0))
+    options["rate"] = float(get_option_value(argv, "--rate", DEFAULT_RATE))
+    options["family"] = get_option_value(argv, "--family", DEFAULT_FAMILY)
+    options["retries"] = int(get_option_value(argv, "--retries", DEFAULT_RETRIES))
+    options["adaptive"] = ("--fixed-timeout" not in argv)
+    options["output_path"] = get_option_value(argv, "-o")
+    options["output_states"] = get_option_value(argv, "--states", DEFAULT_OUTPUT_STATES).split(",")
+    options["journal_path"] = get_option_value(argv, "--state")
+    for state in options["output_states"]:
+        if state not in (PORT_OPEN, PORT_CLOSED, PORT_FILTERED):
+            print("Invalid port state \"{}\".".format(state))
+            print_script_usage()
+            finish(1)
+    if options["family"] not in FAMILIES:
+        print("Invalid address family \"{}\".".format(options["family"]))
+        print_script_usage()
+        finish(1)
+    ports = PORTS
+    ports_spec = get_option_value(argv, "-p")
+    if ports_spec is not None:
+        try:
+            ports = parse_ports(ports_spec)
+        except ValueError as e:
+            print("Invalid ports \"{}\". {}".format(ports_spec, str(e)))
+            finish(1)
+    scan_hosts(l_hosts, ports, engine, timeout, options)
     finish(0)
 
 
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Description: Loopback benchmark of the hosts_ports_check.py scanner engines, against local
+# targets on 127.0.0.0/8 with open, closed and filtered (blackholed) ports.
+
+####################################################################################################
+
+### Libraries ###
+
+from os import devnull, listdir, remove
+from sys import exit
+from sys import argv as sys_argv
+from sys import version as sys_version
+from time import sleep, strftime, perf_counter
+from platform import platform
+from tempfile import NamedTemporaryFile
+from json import dumps as json_dumps
+from json import loads as json_loads
+from traceback import format_exc
+from signal import signal, SIGTERM, SIGINT, SIG_DFL
+from multiprocessing import Process, Pipe
+from selectors import DefaultSelector, EVENT_READ
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from threading import Thread
+import sys
+
+import hosts_ports_check as hpc
+
+####################################################################################################
+
+### Constants ###
+
+FILE_NAME = sys_argv[0]
+
+# First IP of the targets hosts (next hosts use the next IPs)
+TARGETS_FIRST_IP = "127.0.0.10"
+
+# First port of the targets ports: open ports, then filtered ports and then closed ports
+TARGETS_FIRST_PORT = 20000
+
+# Default number of targets hosts, and of open, closed and filtered ports of each host
+DEFAULT_HOSTS = 4
+DEFAULT_OPEN = 50
+DEFAULT_CLOSED = 400
+DEFAULT_FILTERED = 20
+
+# Backlog of open ports listeners
+OPEN_BACKLOG = 1024
+
+# Connections that fill the backlog of filtered ports listeners (backlog 0, never accepted),
+# so new connections SYN are dropped, as by a firewall
+FILTERED_FILL_CONNECTIONS = 4
+
+# Interval between scanner processes resources samples (seconds)
+SAMPLE_INTERVAL = 0.01
+
+####################################################################################################
+
+### Functions ###
+
+def get_and_check_args():
+    '''Function that get and check provided script arguments.'''
+    argv = sys_argv[1:]
+    if ("-h" in argv) or ("--help" in argv):
+        print_script_usage()
+        finish(0)
+    return argv
+
+
+def get_option_value(argv, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-o file"), or default if not found.'''
+    if option not in argv:
+        return default
+    i = argv.index(option)
+    if i+1 >= len(argv):
+        print("Option {} needs a value.".format(option))
+        print_script_usage()
+        finish(1)
+    return argv[i+1]
+
+
+def print_script_usage():
+    '''Function that shows script usage help.'''
+    print("Options:")
+    print("  -e ENGINES    Comma separated engines to benchmark (default all: {}).".format(
+            ",".join(hpc.ENGINES)))
+    print("  --hosts N     Number of targets hosts (default {}).".format(DEFAULT_HOSTS))
+    print("  --open N      Open ports of each host (default {}).".format(DEFAULT_OPEN))
+    print("  --closed N    Closed ports of each host (default {}).".format(DEFAULT_CLOSED))
+    print("  --filtered N  Filtered (blackholed) ports of each host (default {}).".format(
+            DEFAULT_FILTERED))
+    print("  -t TIMEOUT    Scanner connection timeout (default {}).".format(hpc.DEFAULT_TIMEOUT))
+    print("  -c N          Scanner -c option (engine default if not provided).")
+    print("  -j N          Processes engine workers (default all cores).")
+    print("  -o FILE       Write the results as JSON to FILE.")
+    print("Examples:")
+    print("  python3 {}".format(FILE_NAME))
+    print("  python3 {} -e selectors,processes --hosts 16 --closed 4000 -o scan_bench.json".format(
+            FILE_NAME))
+    print("")
+
+
+def get_targets(num_hosts, num_open, num_closed, num_filtered):
+    '''Get the targets hosts IPs, the ports list and the expected state of each (IP, port).'''
+    first_ip = [int(value) for value in TARGETS_FIRST_IP.split(".")]
+    l_hosts = ["127.0.{}.{}".format((first_ip[3] + i) // 256, (first_ip[3] + i) % 256)
+            for i in range(num_hosts)]
+    ports = list(range(TARGETS_FIRST_PORT, TARGETS_FIRST_PORT + num_open + num_filtered +
+            num_closed))
+    expected = {}
+    for host_ip in l_hosts:
+        for i, port in enumerate(ports):
+            if i < num_open:
+                expected[(host_ip, port)] = hpc.PORT_OPEN
+            elif i < num_open + num_filtered:
+                expected[(host_ip, port)] = hpc.PORT_FILTERED
+            else:
+                expected[(host_ip, port)] = hpc.PORT_CLOSED
+    return l_hosts, ports, expected
+
+
+def accept_connections(l_listeners):
+    '''Accept and close the connections of the open ports listeners.'''
+    selector = DefaultSelector()
+    for listener in l_listeners:
+        listener.setblocking(False)
+        selector.register(listener, EVENT_READ)
+    while True:
+        for key, _ in selector.select():
+            try:
+                conn, _ = key.fileobj.accept()
+                conn.close()
+            except (BlockingIOError, InterruptedError):
+                pass
+
+
+def targets_process(expected, conn):
+    '''Targets process: listen on the open ports (accepting connections) and on the filtered
+    ports (with a full backlog that is never accepted). Closed ports have no listener, so
+    connections to them are reset. Send "ready" through conn and serve until terminated.'''
+    signal(SIGINT, SIG_DFL)
+    signal(SIGTERM, SIG_DFL)
+    hpc.get_max_sockets(len(expected) * (FILTERED_FILL_CONNECTIONS + 1))
+    l_open = []
+    l_filtered = []
+    l_fill = []
+    for (host_ip, port), state in expected.items():
+        if state == hpc.PORT_CLOSED:
+            continue
+        listener = socket(AF_INET, SOCK_STREAM)
+        listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        listener.bind((host_ip, port))
+        if state == hpc.PORT_OPEN:
+            listener.listen(OPEN_BACKLOG)
+            l_open.append(listener)
+        else:
+            listener.listen(0)
+            l_filtered.append(listener)
+            for _ in range(FILTERED_FILL_CONNECTIONS):
+                sock = socket(AF_INET, SOCK_STREAM)
+                sock.setblocking(False)
+                sock.connect_ex((host_ip, port))
+                l_fill.append(sock)
+    Thread(target=accept_connections, args=(l_open,), daemon=True).start()
+    # Let the filling connections complete the handshake
+    sleep(0.2)
+    conn.send("ready")
+    while True:
+        sleep(1)
+
+
+def engine_process(engine, l_hosts, ports, timeout, options):
+    '''Scanner process: scan the targets with an engine, hiding its output.'''
+    signal(SIGINT, SIG_DFL)
+    signal(SIGTERM, SIG_DFL)
+    sys.stdout = open(devnull, "w")
+    hpc.scan_hosts(l_hosts, ports, engine, timeout, options)
+
+
+def get_children_pids(pid):
+    '''Get the PIDs of a process descendants.'''
+    parents = {}
+    for entry in listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry), "r") as f:
+                # ppid is the 2nd field after the command name, that can contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except Exception:
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    l_pids = []
+    pending = [pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        l_pids.extend(children)
+        pending.extend(children)
+    return l_pids
+
+
+def get_process_resources(pid):
+    '''Get the open file descriptors, threads and RSS (bytes) of a process (Linux /proc).'''
+    num_fds = len(listdir("/proc/{}/fd".format(pid)))
+    num_threads = 0
+    rss = 0
+    with open("/proc/{}/status".format(pid), "r") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                num_threads = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) * 1024
+    return num_fds, num_threads, rss
+
+
+def sample_resources(pid):
+    '''Get the open file descriptors, threads and RSS of a process and its descendants.
+    Return None if they can't be read.'''
+    totals = [0, 0, 0]
+    try:
+        l_pids = [pid] + get_children_pids(pid)
+    except Exception:
+        return None
+    for process_pid in l_pids:
+        try:
+            resources = get_process_resources(process_pid)
+        except Exception:
+            # Process finished while sampling
+            continue
+        for i in range(3):
+            totals[i] += resources[i]
+    return totals
+
+
+def load_scan_results(output_path):
+    '''Load the ports states of a scan results JSON lines file as {(ip, port): state}.'''
+    states = {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json_loads(line)
+            states[(record["ip"], record["port"])] = record["state"]
+    return states
+
+
+def bench_engine(engine, l_hosts, ports, expected, timeout, options):
+    '''Run a scanner engine against the targets in its own process, sampling its resources.
+    Return the benchmark result.'''
+    with NamedTemporaryFile(prefix="scanbench_", suffix=".jsonl", delete=False) as f:
+        output_path = f.name
+    with NamedTemporaryFile(prefix="scanbench_hosts_open_", delete=False) as f:
+        hosts_open_path = f.name
+    options = dict(options)
+    options["output_path"] = output_path
+    options["output_states"] = (hpc.PORT_OPEN, hpc.PORT_CLOSED, hpc.PORT_FILTERED)
+    options["hosts_open_path"] = hosts_open_path
+    try:
+        peaks = None
+        t0 = perf_counter()
+        process = Process(target=engine_process, args=(engine, l_hosts, ports, timeout, options))
+        process.start()
+        while process.is_alive():
+            resources = sample_resources(process.pid)
+            if resources is not None:
+                if peaks is None:
+                    peaks = resources
+                else:
+                    peaks = [max(peak, value) for peak, value in zip(peaks, resources)]
+            sleep(SAMPLE_INTERVAL)
+        process.join()
+        seconds = perf_counter() - t0
+        states = load_scan_results(output_path)
+    finally:
+        remove(output_path)
+        remove(hosts_open_path)
+    # Accuracy by expected state
+    l_states = [hpc.PORT_OPEN, hpc.PORT_CLOSED, hpc.PORT_FILTERED]
+    totals = dict([(state, 0) for state in l_states])
+    matches = dict([(state, 0) for state in l_states])
+    for target, state in expected.items():
+        totals[state] += 1
+        if states.get(target) == state:
+            matches[state] += 1
+    num_targets = len(expected)
+    num_matches = sum(matches.values())
+    result = {"engine": engine, "exit_code": process.exitcode, "targets": num_targets,
+            "seconds": seconds, "connects_per_second": num_targets / seconds if seconds else 0.0,
+            "accuracy": num_matches / num_targets if num_targets else 1.0,
+            "accuracy_by_state": dict([(state, matches[state] / totals[state])
+                for state in l_states if totals[state]]),
+            "peak_fds": None, "peak_threads": None, "peak_rss": None}
+    if peaks is not None:
+        result["peak_fds"], result["peak_threads"], result["peak_rss"] = peaks
+    return result
+
+
+def show_bench_result(result):
+    '''Show an engine benchmark result line (resources that can't be sampled are shown as "-").'''
+    peak_rss = "-"
+    if result["peak_rss"] is not None:
+        peak_rss = "{:.1f}".format(result["peak_rss"] / 1e6)
+    accuracy_by_state = " ".join(["{} {:.0%}".format(state, accuracy)
+            for state, accuracy in result["accuracy_by_state"].items()])
+    print(("{:<10} {:>8.2f} s {:>10.0f} conn/s {:>7.2%} acc ({}) {:>6} fds {:>5} thr {:>8} MB"
+            "{}").format(result["engine"], result["seconds"], result["connects_per_second"],
+            result["accuracy"], accuracy_by_state,
+            "-" if result["peak_fds"] is None else result["peak_fds"],
+            "-" if result["peak_threads"] is None else result["peak_threads"], peak_rss,
+            "" if result["exit_code"] == 0 else "  exit({})".format(result["exit_code"])))
+
+####################################################################################################
+
+### Main and Finish Functions ###
+
+def main():
+    '''Main Function.'''
+    targets = None
+    try:
+        argv = get_and_check_args()
+        l_engines = get_option_value(argv, "-e", ",".join(hpc.ENGINES)).split(",")
+        for engine in l_engines:
+            if engine not in hpc.ENGINES:
+                print("Unknown scanner engine \"{}\".".format(engine))
+                print_script_usage()
+                finish(1)
+        num_hosts = int(get_option_value(argv, "--hosts", DEFAULT_HOSTS))
+        num_open = int(get_option_value(argv, "--open", DEFAULT_OPEN))
+        num_closed = int(get_option_value(argv, "--closed", DEFAULT_CLOSED))
+        num_filtered = int(get_option_value(argv, "--filtered", DEFAULT_FILTERED))
+        timeout = float(get_option_value(argv, "-t", hpc.DEFAULT_TIMEOUT))
+        output_path = get_option_value(argv, "-o")
+        options = {}
+        options["max_concurrency"] = int(get_option_value(argv, "-c", 0))
+        options["num_workers"] = int(get_option_value(argv, "-j", 0))
+        l_hosts, ports, expected = get_targets(num_hosts, num_open, num_closed, num_filtered)
+        # Start targets
+        conn_recv, conn_send = Pipe(duplex=False)
+        targets = Process(target=targets_process, args=(expected, conn_send), daemon=True)
+        targets.start()
+        if (not conn_recv.poll(30)) or (conn_recv.recv() != "ready"):
+            print("Targets not ready, exiting.")
+            finish(1)
+        print("Targets: {} hosts x {} ports ({} open, {} closed, {} filtered), timeout {} s".format(
+                num_hosts, len(ports), num_open, num_closed, num_filtered, timeout))
+        print("")
+        # Benchmark each engine
+        results = []
+        for engine in l_engines:
+            result = bench_engine(engine, l_hosts, ports, expected, timeout, options)
+            show_bench_result(result)
+            results.append(result)
+        num_fails = len([result for result in results if result["accuracy"] < 1.0])
+        print("")
+        print("Engines with mismatches: {}".format(num_fails))
+        if output_path is not None:
+            report = {"timestamp": strftime("%Y-%m-%dT%H:%M:%S%z"), "python": sys_version,
+                    "platform": platform(), "hosts": num_hosts, "open": num_open,
+                    "closed": num_closed, "filtered": num_filtered, "timeout": timeout,
+                    "results": results}
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(json_dumps(report, indent=2))
+            print("Results written to {}".format(output_path))
+        if num_fails:
+            finish(1)
+    except Exception:
+        print("\n[ERROR]\n{}".format(format_exc()))
+        finish(1)
+    finally:
+        if (targets is not None) and targets.is_alive():
+            targets.terminate()
+    finish(0)
+
+
+def finish(return_code):
+    '''Finish function.'''
+    exit(return_code)
+
+####################################################################################################
+
+### Termination signals handler for program process ###
+
+def signal_handler(signal, frame):
+    '''Termination signals (SIGINT, SIGTERM) handler for program process'''
+    finish(1)
+
+
+# Signals attachment
+signal(SIGTERM, signal_handler) # SIGTERM (kill pid) to signal_handler
+signal(SIGINT, signal_handler)  # SIGINT (Ctrl+C) to signal_handler
+
+####################################################################################################
+
+### Script Input - Main Script ###
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        finish(0)
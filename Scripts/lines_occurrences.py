@@ -7,73 +7,684 @@
 
 from sys import argv
 from sys import exit
+from sys import stdin
+from os import path, stat, replace, cpu_count
+from glob import glob
+from zlib import crc32
+from mmap import mmap, ACCESS_READ
+from hashlib import blake2b
+from json import dumps as json_dumps
+from json import load as json_load
+from locale import getpreferredencoding
+from concurrent.futures import ProcessPoolExecutor
+from heapq import nlargest, merge, heappop, heappush
+from itertools import chain
+from collections import Counter, deque
+from tempfile import TemporaryDirectory
+from resource import getrlimit, setrlimit, RLIMIT_NOFILE
+
+####################################################################################################
+
+### Constants ###
+
+# Default memory budget of external-memory mode (MB)
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Estimated memory used to count each distinct line of a partition besides its text (str
+# object, dict entry, [count, index] list and index int, plus the item tuple and list slots of
+# the sorted run), used to get the number of partitions in external-memory mode
+MEMORY_BYTES_PER_LINE = 260
+
+# Size of the sample read at the start of each file to estimate its average line size in
+# external-memory mode
+LINE_SIZE_SAMPLE_SIZE = 1024*1024
+
+# Maximum number of partitions (spill files open at once) in external-memory mode
+MAX_PARTITIONS = 1024
+
+# File descriptors reserved for stdio, input files and Python internals in external-memory mode
+RESERVED_FDS = 32
+
+# Minimum and maximum size of the file byte ranges counted by each worker in parallel mode
+RANGE_MIN_SIZE = 1024*1024
+RANGE_MAX_SIZE = 64*1024*1024
+
+# Default maximum error of approximate mode counts (fraction of the total number of lines)
+DEFAULT_APPROX_ERROR = 0.001
+
+# Size of the chunks split into lines at once in digest mode
+DIGEST_CHUNK_SIZE = 1024*1024
+
+# Default size in bytes of the lines digests in digest mode (8 for 64 bits, 16 for 128 bits)
+DEFAULT_DIGEST_SIZE = 8
+
+# Number of bytes at file start used to detect rewritten files in incremental mode
+CHECKPOINT_HEAD_SIZE = 1024
+
+# Options that need a value
+OPTIONS_WITH_VALUE = ["-k", "-j", "--memory", "--partitions", "--tmp-dir", "--error",
+        "--report-every", "--state", "--digest-bits"]
 
 ####################################################################################################
 
 ### Functions ###
 
-def value_in_list_element(value, in_list, key):
-    '''Check if provided list has any element with that key value.'''
-    for element in in_list:
-        if element[key] == value:
-            return True
-    return False
+def get_option_value(args, option, default=None):
+    '''Get the value provided after an option argument (i.e. "-k 10"), or default if not found.'''
+    if option not in args:
+        return default
+    i = args.index(option)
+    if i+1 >= len(args):
+        print("Error: Option {} needs a value.".format(option))
+        finish(1)
+    return args[i+1]
+
+
+def get_positional_args(args):
+    '''Get the arguments that are not options nor options values.'''
+    l_args = []
+    skip_next = False
+    for arg in args:
+        if skip_next:
+            skip_next = False
+        elif arg in OPTIONS_WITH_VALUE:
+            skip_next = True
+        elif not arg.startswith("--"):
+            l_args.append(arg)
+    return l_args
+
+
+def expand_file_paths(l_args):
+    '''Expand glob patterns of a list of files arguments (keeping the order of arguments).'''
+    l_paths = []
+    for arg in l_args:
+        if any(c in arg for c in "*?["):
+            l_matches = sorted(glob(arg))
+            if len(l_matches) == 0:
+                print("No files match \"{}\".".format(arg))
+            l_paths.extend(l_matches)
+        else:
+            l_paths.append(arg)
+    return list(dict.fromkeys(l_paths))
 
 
 def file_read(file_path):
-    '''Read file lines content and return them in a list.'''
-    lines = []
+    '''Read file lines content (or stdin if file path is "-") and yield them one by one (empty
+    lines are skipped).'''
     try:
-        with open(file_path, "r") as f:
+        if file_path == "-":
+            f = stdin
+        else:
+            f = open(file_path, "r")
+        with f:
             for line in f:
-                if line is None:
-                    continue
                 if (line == "") or (line == "\r\n") or (line == "\r") or (line == "\n"):
                     continue
-                line = line.replace("\r", "")
-                line = line.replace("\n", "")
-                lines.append(line)
+                yield line.rstrip("\r\n")
     except Exception as e:
         print("Error when opening file \"{}\". {}".format(file_path, str(e)))
         finish(1)
-    if len(lines) == 0:
-        print("No topics found in file \"{}\".".format(file_path))
-        finish(1)
-    return lines
+
+
+def count_lines(lines):
+    '''Count the number of occurrences of each line in a hash map (keys keep first occurrence
+    order).'''
+    return Counter(lines)
+
+
+def sort_counted_lines(counted_lines, top_k=None):
+    '''Get a list of (line, number of occurrences) ordered by number of occurrences (ties in
+    first occurrence order). If top_k is provided, only the top_k most frequent lines are
+    returned (the same lines at the end of the full list), selected through a heap.'''
+    if top_k is None:
+        return sorted(counted_lines.items(), key=lambda item: item[1])
+    l_top = nlargest(top_k, enumerate(counted_lines.items()), key=lambda x: (x[1][1], x[0]))
+    return [item for _, item in reversed(l_top)]
+
+
+def file_split_ranges(file_path, num_workers):
+    '''Split a file in byte ranges that end just after a newline, to be counted in parallel.
+    Return a list of (start, end) offsets.'''
+    size = path.getsize(file_path)
+    range_size = min(max(-(-size // num_workers), RANGE_MIN_SIZE), RANGE_MAX_SIZE)
+    l_ranges = []
+    start = 0
+    with open(file_path, "rb") as f:
+        while start < size:
+            end = start + range_size
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = min(f.tell(), size)
+            l_ranges.append((start, end))
+            start = end
+    return l_ranges
+
+
+def count_bytes_lines(data):
+    '''Count the lines of a file bytes chunk (keys keep first occurrence order). Lines are
+    split and cleaned like file_read() does.'''
+    text = data.decode(getpreferredencoding(False))
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    counted = Counter(text.split("\n"))
+    counted.pop("", None)
+    return counted
+
+
+def count_range_worker(file_path, start, end):
+    '''Parallel mode worker: count the lines of a file byte range (keys keep first occurrence
+    order).'''
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return count_bytes_lines(data)
+
+
+def count_lines_parallel(l_paths, num_workers=None):
+    '''Count the number of occurrences of each line of a list of files in a pool of processes.
+    Files are split in newline aligned byte ranges and partial counters are merged in ranges
+    order, so keys keep the global first occurrence order (same result than count_lines()).'''
+    if not num_workers:
+        num_workers = cpu_count() or 1
+    l_tasks = []
+    for file_path in l_paths:
+        try:
+            for start, end in file_split_ranges(file_path, num_workers):
+                l_tasks.append((file_path, start, end))
+        except Exception as e:
+            print("Error when opening file \"{}\". {}".format(file_path, str(e)))
+            finish(1)
+    counted_lines = Counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        l_partials = executor.map(count_range_worker, [task[0] for task in l_tasks],
+                [task[1] for task in l_tasks], [task[2] for task in l_tasks])
+        for partial in l_partials:
+            counted_lines.update(partial)
+    return counted_lines
+
+
+def count_lines_digest(l_paths, digest_size=DEFAULT_DIGEST_SIZE):
+    '''Count the lines of files memory mapped and split in bytes (without decoding them), keyed
+    by a digest of each line. Only the location of the first occurrence of each line is kept
+    as sample, so memory usage doesn't depend on lines length. Lines are split like
+    file_read() does ("\\r\\n" and "\\r" are line breaks too, empty lines are skipped).
+    Return a dictionary (keys keep first occurrence order) of
+    digest: [number of occurrences, file index, sample offset, sample length].'''
+    counted = {}
+    for file_index, file_path in enumerate(l_paths):
+        try:
+            f = open(file_path, "rb")
+        except Exception as e:
+            print("Error when opening file \"{}\". {}".format(file_path, str(e)))
+            finish(1)
+        with f:
+            # Empty files can't be memory mapped
+            size = path.getsize(file_path)
+            if size == 0:
+                continue
+            with mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+                start = 0
+                while start < size:
+                    # Chunk ends after the last newline of the window (or the first one
+                    # after it for lines longer than the window)
+                    if start + DIGEST_CHUNK_SIZE >= size:
+                        end = size
+                    else:
+                        end = mm.rfind(b"\n", start, start + DIGEST_CHUNK_SIZE) + 1
+                        if end <= start:
+                            end = mm.find(b"\n", start + DIGEST_CHUNK_SIZE) + 1
+                            if end <= 0:
+                                end = size
+                    offset = start
+                    for line in mm[start:end].split(b"\n"):
+                        if b"\r" in line:
+                            l_pieces = line.split(b"\r")
+                        else:
+                            l_pieces = (line,)
+                        for piece in l_pieces:
+                            if piece:
+                                key = blake2b(piece, digest_size=digest_size).digest()
+                                value = counted.get(key)
+                                if value is None:
+                                    counted[key] = [1, file_index, offset, len(piece)]
+                                else:
+                                    value[0] += 1
+                            offset += len(piece) + 1
+                    start = end
+    return counted
+
+
+def digest_counted_lines_text(l_sorted, l_paths):
+    '''Get (line text, number of occurrences) of digest mode sorted counts, reading and
+    decoding the sample text of each line from the files only when it is needed.'''
+    encoding = getpreferredencoding(False)
+    files = {}
+    try:
+        for num, file_index, offset, length in l_sorted:
+            if file_index not in files:
+                files[file_index] = open(l_paths[file_index], "rb")
+            f = files[file_index]
+            f.seek(offset)
+            yield (f.read(length).decode(encoding, "replace"), num)
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def sort_digest_counted_lines(counted, top_k=None):
+    '''Get the digest mode counts values ordered like sort_counted_lines() does.'''
+    if top_k is None:
+        return sorted(counted.values(), key=lambda value: value[0])
+    l_top = nlargest(top_k, enumerate(counted.values()), key=lambda x: (x[1][0], x[0]))
+    return [value for _, value in reversed(l_top)]
+
+
+def state_load(state_path):
+    '''Load the incremental counting state (files checkpoints and lines counters).'''
+    state = {"files": {}, "lines": []}
+    if path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state.update(json_load(f))
+    return state
+
+
+def state_save(state_path, state):
+    '''Save the incremental counting state (written to a temporary file and then renamed).'''
+    tmp_path = "{}.tmp".format(state_path)
+    with open(tmp_path, "w", encoding="utf-8", errors="surrogatepass") as f:
+        f.write(json_dumps(state))
+    replace(tmp_path, state_path)
+
+
+def count_file_from_offset(file_path, offset, counted_lines):
+    '''Count the complete lines of a file from a byte offset into counted_lines (the last line
+    is left for the next run if it doesn't end with a newline yet). Return the offset where
+    the next run must start.'''
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        pending = b""
+        while True:
+            chunk = f.read(RANGE_MAX_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk
+            cut = data.rfind(b"\n") + 1
+            data, pending = data[:cut], data[cut:]
+            if data:
+                counted_lines.update(count_bytes_lines(data))
+                offset += len(data)
+    return offset
+
+
+def file_head_crc(file_path, offset):
+    '''Get the CRC of the first bytes of a file (up to offset), to detect rewritten files.'''
+    with open(file_path, "rb") as f:
+        return crc32(f.read(min(offset, CHECKPOINT_HEAD_SIZE)))
+
+
+def checkpoint_find_copied(file_path, size, checkpoints):
+    '''Find the checkpoint of the file that a new file was copied from (copytruncate rotation
+    copies the log to a new inode and then truncates it): its first bytes are the same and it is
+    not smaller than the checkpoint offset. Return the matching checkpoint with the biggest
+    offset, or None if there isn't any.'''
+    found = None
+    for checkpoint in checkpoints.values():
+        if (size < checkpoint["offset"]) or (checkpoint["offset"] == 0):
+            continue
+        if (found is not None) and (found["offset"] >= checkpoint["offset"]):
+            continue
+        if file_head_crc(file_path, checkpoint["offset"]) == checkpoint["head_crc"]:
+            found = checkpoint
+    return found
+
+
+def count_lines_incremental(l_paths, state_path):
+    '''Count the lines of append-only files, processing only the bytes appended since the last
+    run. Files checkpoints (offset by device and inode, so a rotated file that was renamed is
+    still read from its checkpoint) and lines counters are kept in a state file. A new file
+    whose first bytes match a checkpointed file is read from that checkpoint (rotated copy of a
+    copytruncate rotation). A file is read again from the start if it is new (i.e. created by
+    rotation), was truncated or its first bytes changed (rewritten).
+    Return the updated lines counters (keys keep first occurrence order).'''
+    state = state_load(state_path)
+    counted_lines = Counter(dict(state["lines"]))
+    files = {}
+    for file_path in l_paths:
+        try:
+            st = stat(file_path)
+            file_id = "{}:{}".format(st.st_dev, st.st_ino)
+            checkpoint = state["files"].get(file_id)
+            if checkpoint is None:
+                checkpoint = checkpoint_find_copied(file_path, st.st_size, state["files"])
+            offset = 0
+            if (checkpoint is not None) and (st.st_size >= checkpoint["offset"]) and \
+                    (file_head_crc(file_path, checkpoint["offset"]) == checkpoint["head_crc"]):
+                offset = checkpoint["offset"]
+            offset = count_file_from_offset(file_path, offset, counted_lines)
+            head_crc = file_head_crc(file_path, offset)
+        except Exception as e:
+            print("Error when opening file \"{}\". {}".format(file_path, str(e)))
+            finish(1)
+        files[file_id] = {"path": file_path, "offset": offset, "head_crc": head_crc}
+    state["files"] = files
+    state["lines"] = list(counted_lines.items())
+    state_save(state_path, state)
+    return counted_lines
+
+
+def external_num_partitions(l_paths, memory_budget_mb):
+    '''Get the number of partitions needed to count files lines under a memory budget. The
+    number of lines of each file is estimated from the average line size of its first bytes,
+    and all of them are assumed distinct (worst case), each one using its text size plus
+    MEMORY_BYTES_PER_LINE.'''
+    needed_bytes = 0
+    for file_path in l_paths:
+        size = path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            sample = f.read(LINE_SIZE_SAMPLE_SIZE)
+        line_size = len(sample) / max(sample.count(b"\n"), 1)
+        num_lines = size / max(line_size, 1)
+        needed_bytes += int(size + num_lines * MEMORY_BYTES_PER_LINE)
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    num_partitions = -(-needed_bytes // budget_bytes)
+    return min(max(num_partitions, 1), MAX_PARTITIONS)
+
+
+def get_max_open_files(max_files):
+    '''Get the maximum number of spill files that can be opened at once (up to max_files),
+    raising the process file descriptors soft limit to the hard limit if needed.'''
+    soft, hard = getrlimit(RLIMIT_NOFILE)
+    if soft < max_files + RESERVED_FDS:
+        try:
+            new_soft = max_files + RESERVED_FDS
+            if hard >= 0:
+                new_soft = min(new_soft, hard)
+            setrlimit(RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except Exception:
+            pass
+    return max(min(max_files, soft - RESERVED_FDS), 1)
+
+
+def spill_open(file_path, mode):
+    '''Open a spill file (lossless for any line text).'''
+    return open(file_path, mode, encoding="utf-8", errors="surrogatepass", newline="\n")
+
+
+def count_lines_external(lines, num_partitions, tmp_dir=None):
+    '''Count the number of occurrences of each line out of core and yield (line, number of
+    occurrences) ordered by number of occurrences (ties in first occurrence order), the same
+    order than sort_counted_lines().
+    Lines are hash-partitioned with their first occurrence index into num_partitions spill
+    files, each partition is counted independently into a sorted run file, and the runs are
+    merged, so only one partition is kept in memory at once. All the spill (and then run) files
+    are open at once, so num_partitions is limited by the open files limit.'''
+    num_partitions = get_max_open_files(num_partitions)
+    with TemporaryDirectory(prefix="lines_occurrences_", dir=tmp_dir) as work_dir:
+        # Hash-partition lines into spill files
+        l_spill_paths = [path.join(work_dir, "spill_{}.txt".format(i))
+                for i in range(num_partitions)]
+        l_spill_files = [spill_open(spill_path, "w") for spill_path in l_spill_paths]
+        try:
+            for index, line in enumerate(lines):
+                partition = crc32(line.encode("utf-8", "surrogatepass")) % num_partitions
+                l_spill_files[partition].write("{}\t{}\n".format(index, line))
+        finally:
+            for spill_file in l_spill_files:
+                spill_file.close()
+        # Count each partition into a sorted run file
+        l_run_paths = []
+        for spill_path in l_spill_paths:
+            counted = {}
+            with spill_open(spill_path, "r") as f:
+                for spill_line in f:
+                    index, line = spill_line[:-1].split("\t", 1)
+                    if line in counted:
+                        counted[line][0] += 1
+                    else:
+                        counted[line] = [1, int(index)]
+            run_path = "{}.run".format(spill_path)
+            with spill_open(run_path, "w") as f:
+                for line, (num, index) in sorted(counted.items(), key=lambda item: item[1]):
+                    f.write("{}\t{}\t{}\n".format(num, index, line))
+            counted = None
+            l_run_paths.append(run_path)
+        # Merge the sorted runs
+        l_run_files = [spill_open(run_path, "r") for run_path in l_run_paths]
+        try:
+            runs = [(run_line[:-1].split("\t", 2) for run_line in f) for f in l_run_files]
+            runs = [((int(num), int(index), line) for num, index, line in run) for run in runs]
+            for num, _, line in merge(*runs):
+                yield (line, num)
+        finally:
+            for run_file in l_run_files:
+                run_file.close()
+
+####################################################################################################
+
+### Classes ###
+
+class SpaceSaving(object):
+    '''Space-Saving approximate counter of the most frequent lines with a fixed number of
+    counters. Each count overestimates the real number of occurrences by at most its error,
+    and every error is lower than total/capacity.'''
+
+    def __init__(self, capacity):
+        '''Class Constructor'''
+        self.capacity = capacity
+        self.total = 0
+        # Line: [count, error]
+        self.counters = {}
+        # Min-heap of (count, line), counts in heap can be lower than real ones (lazy update)
+        self.heap = []
+
+
+    def add(self, line):
+        '''Count a line occurrence.'''
+        self.total += 1
+        counter = self.counters.get(line)
+        if counter is not None:
+            counter[0] += 1
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[line] = [1, 0]
+            heappush(self.heap, (1, line))
+            return
+        # Replace the line with the minimum count
+        while True:
+            count, min_line = heappop(self.heap)
+            real_count = self.counters[min_line][0]
+            if real_count == count:
+                break
+            heappush(self.heap, (real_count, min_line))
+        del self.counters[min_line]
+        self.counters[line] = [count + 1, count]
+        heappush(self.heap, (count + 1, line))
+
+
+    def update(self, lines):
+        '''Count all the lines of an iterable.'''
+        for line in lines:
+            self.add(line)
+
+
+    def max_error(self):
+        '''Get the maximum error of any count.'''
+        if len(self.counters) < self.capacity:
+            return 0
+        return self.total // self.capacity
+
+
+    def top(self, top_k=None):
+        '''Get a list of (line, count, error) of the top_k (all if None) most frequent lines,
+        ordered by count.'''
+        l_items = [(line, count, error) for line, (count, error) in self.counters.items()]
+        if top_k is not None:
+            l_items = nlargest(top_k, l_items, key=lambda item: item[1])
+        return sorted(l_items, key=lambda item: item[1])
 
 ####################################################################################################
 
 ### Main and Finish Functions ###
 
+def show_approx_counted_lines(l_paths, options):
+    '''Approximately count the most frequent lines of a group of files (or stdin) with fixed
+    memory and show the result with the error margin of each count (periodically if
+    report_every lines is provided).'''
+    capacity = max(int(1 / options["approx_error"]), options["top_k"] or 0, 1)
+    counter = SpaceSaving(capacity)
+    lines = chain.from_iterable(file_read(file_path) for file_path in l_paths)
+    report_every = options["report_every"]
+    if report_every:
+        for num_lines, line in enumerate(lines, 1):
+            counter.add(line)
+            if num_lines % report_every == 0:
+                show_approx_report(counter, options["top_k"])
+                print("", flush=True)
+    else:
+        counter.update(lines)
+    if counter.total == 0:
+        print("No topics found in file {}.".format(
+                ", ".join(["\"{}\"".format(file_path) for file_path in l_paths])))
+        return False
+    show_approx_report(counter, options["top_k"])
+    return True
+
+
+def show_approx_report(counter, top_k):
+    '''Show the approximate counts of the most frequent lines. Counts are only overestimated,
+    so each one is shown with its error as "[count -error]" (the real number of occurrences is
+    between count-error and count).'''
+    print("Approximate lines and number of occurrences ({} lines, {} counters, max error {}):"
+            .format(counter.total, counter.capacity, counter.max_error()))
+    for text, num, error in counter.top(top_k):
+        print("[{} -{}] {}".format(num, error, text))
+
+
+def show_counted_lines(l_paths, options):
+    '''Count the lines occurrences of a group of files and show the result.'''
+    if options["approx"]:
+        return show_approx_counted_lines(l_paths, options)
+    top_k = options["top_k"]
+    files_text = ", ".join(["\"{}\"".format(file_path) for file_path in l_paths])
+    if options["external"]:
+        # External-memory mode, lines come out already ordered
+        num_partitions = options["num_partitions"]
+        if num_partitions is None:
+            num_partitions = external_num_partitions(l_paths, options["memory_budget_mb"])
+        lines = chain.from_iterable(file_read(file_path) for file_path in l_paths)
+        counted_lines = count_lines_external(lines, num_partitions, options["tmp_dir"])
+        if top_k is not None:
+            counted_lines = deque(counted_lines, maxlen=top_k)
+        counted_lines = iter(counted_lines)
+        first_line = next(counted_lines, None)
+        if first_line is None:
+            print("No topics found in file {}.".format(files_text))
+            return False
+        counted_lines = chain([first_line], counted_lines)
+    elif options["digest_size"] is not None:
+        # Digest mode, line texts are read from the files only for shown lines
+        counted = count_lines_digest(l_paths, options["digest_size"])
+        if len(counted) == 0:
+            print("No topics found in file {}.".format(files_text))
+            return False
+        counted_lines = digest_counted_lines_text(sort_digest_counted_lines(counted, top_k),
+                l_paths)
+    else:
+        if options["state_path"] is not None:
+            counted_lines = count_lines_incremental(l_paths, options["state_path"])
+        elif options["num_workers"] is not None:
+            counted_lines = count_lines_parallel(l_paths, options["num_workers"])
+        else:
+            lines = chain.from_iterable(file_read(file_path) for file_path in l_paths)
+            counted_lines = count_lines(lines)
+        if len(counted_lines) == 0:
+            print("No topics found in file {}.".format(files_text))
+            return False
+        # Order list by number of occureences
+        counted_lines = sort_counted_lines(counted_lines, top_k)
+    # Show result
+    if not options["show_paths"]:
+        print("Lines and number of occurrences:")
+    else:
+        print("Lines and number of occurrences in {}:".format(files_text))
+    for text, num in counted_lines:
+        print("[{}] {}".format(num, text))
+    return True
+
+
 def main():
     '''Main Function.'''
-    # Check if script is running with expected argument
-    if len(argv) != 2:
+    # Check if script is running with expected arguments
+    l_files = expand_file_paths(get_positional_args(argv[1:]))
+    if len(l_files) == 0:
         print("Error: This script needs 1 argument (file to read).")
+        print("Usage: python {} file.txt [file2.txt \"logs/*.log\" ...] [-k TOP_K]"
+                " [-j N] [--per-file]".format(argv[0]))
+        print("       python {} file.txt --external [--memory MB] [--partitions N]"
+                " [--tmp-dir DIR]".format(argv[0]))
+        print("       python {} file.txt|- --approx [-k TOP_K] [--error EPS]"
+                " [--report-every N]".format(argv[0]))
+        print("       python {} app.log \"app.log.*\" --state counts.json [-k TOP_K]".format(
+                argv[0]))
+        print("       python {} file.txt --digest [--digest-bits 64|128] [-k TOP_K]".format(
+                argv[0]))
+        finish(1)
+    options = {}
+    options["top_k"] = get_option_value(argv[1:], "-k")
+    if options["top_k"] is not None:
+        options["top_k"] = int(options["top_k"])
+    options["num_workers"] = get_option_value(argv[1:], "-j")
+    if options["num_workers"] is not None:
+        options["num_workers"] = int(options["num_workers"])
+    options["external"] = ("--external" in argv[1:])
+    options["memory_budget_mb"] = int(get_option_value(argv[1:], "--memory",
+            DEFAULT_MEMORY_BUDGET_MB))
+    if options["memory_budget_mb"] < 1:
+        print("Error: --memory must be a positive number of MB.")
         finish(1)
-    # Read file lines
+    options["num_partitions"] = get_option_value(argv[1:], "--partitions")
+    if options["num_partitions"] is not None:
+        options["num_partitions"] = int(options["num_partitions"])
+        if options["num_partitions"] < 1:
+            print("Error: --partitions must be a positive number.")
+            finish(1)
+    options["tmp_dir"] = get_option_value(argv[1:], "--tmp-dir")
+    options["approx"] = ("--approx" in argv[1:])
+    options["approx_error"] = float(get_option_value(argv[1:], "--error", DEFAULT_APPROX_ERROR))
+    options["report_every"] = get_option_value(argv[1:], "--report-every")
+    if options["report_every"] is not None:
+        options["report_every"] = int(options["report_every"])
+    options["state_path"] = get_option_value(argv[1:], "--state")
+    options["digest_size"] = None
+    if "--digest" in argv[1:]:
+        options["digest_size"] = DEFAULT_DIGEST_SIZE
+        if get_option_value(argv[1:], "--digest-bits") is not None:
+            options["digest_size"] = int(get_option_value(argv[1:], "--digest-bits")) // 8
+    options["show_paths"] = (len(l_files) > 1)
+    per_file = ("--per-file" in argv[1:])
+    if per_file and (options["state_path"] is not None):
+        # The state file keeps a single lines counter for all the files
+        print("Error: --state can't be used with --per-file.")
+        finish(1)
+    # Read files lines, count occurrences and show results (combined or per file report)
     print("Reading file lines...")
-    lines = file_read(argv[1])
-    # Check for occurrences
     try:
-        counted_lines = []
-        for line in lines:
-            # Check if line is in any "text" attribute of any elemnt inside counted_lines list
-            if not value_in_list_element(line, counted_lines, "text"):
-                line_info = {"text":"", "num":""}
-                line_info["text"] = line
-                line_info["num"] = 1
-                counted_lines.append(line_info)
-            else:
-                for element in counted_lines:
-                    if line == element["text"]:
-                        element["num"] = element["num"] + 1
-        # Order list by number of occureences
-        counted_lines = sorted(counted_lines, key=lambda k: k["num"])
-        # Show result
-        print("Lines and number of occurrences:")
-        for element in counted_lines:
-            print("[{}] {}".format(element["num"], element["text"]))
+        if per_file:
+            l_groups = [[file_path] for file_path in l_files]
+        else:
+            l_groups = [l_files]
+        any_found = False
+        for i, l_paths in enumerate(l_groups):
+            if i > 0:
+                print("")
+            if show_counted_lines(l_paths, options):
+                any_found = True
+        if not any_found:
+            finish(1)
     except Exception as e:
         print("Error: {}".format(e))
         finish(1)